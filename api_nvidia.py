@@ -3,6 +3,9 @@ from flask import Flask, request, Response, jsonify
 from openai import OpenAI
 from dotenv import load_dotenv
 
+import llm_telemetry
+from llm_cache import create_completion
+
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -11,7 +14,8 @@ app = Flask(__name__)
 # Configura o cliente OpenAI com as variáveis de ambiente
 client = OpenAI(
     base_url=os.getenv("OPENAI_BASE_URL", "https://integrate.api.nvidia.com/v1"),
-    api_key=os.getenv("OPENAI_API_KEY", "$API_KEY_REQUIRED_IF_EXECUTING_OUTSIDE_NGC")
+    api_key=os.getenv("OPENAI_API_KEY", "$API_KEY_REQUIRED_IF_EXECUTING_OUTSIDE_NGC"),
+    max_retries=0
 )
 
 @app.route('/generate', methods=['POST'])
@@ -20,24 +24,36 @@ def generate_text():
     prompt = data.get('prompt', "Write a limerick about the wonders of GPU computing.")
     
     def generate():
+        model = os.getenv("OPENAI_MODEL", "nvidia/llama-3.1-nemotron-70b-instruct")
         try:
-            completion = client.chat.completions.create(
-                model=os.getenv("OPENAI_MODEL", "nvidia/llama-3.1-nemotron-70b-instruct"),
-                messages=[{"role": "user", "content": prompt}],
-                temperature=float(os.getenv("TEMPERATURE", 0.5)),
-                top_p=float(os.getenv("TOP_P", 1)),
-                max_tokens=int(os.getenv("MAX_TOKENS", 1024)),
-                stream=True
-            )
-
-            for chunk in completion:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            with llm_telemetry.track('api_nvidia', model) as call:
+                completion = create_completion(
+                    client, call,
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=float(os.getenv("TEMPERATURE", 0.5)),
+                    top_p=float(os.getenv("TOP_P", 1)),
+                    max_tokens=int(os.getenv("MAX_TOKENS", 1024)),
+                    stream=True
+                )
+
+                parts = []
+                for chunk in completion:
+                    if chunk.choices[0].delta.content is not None:
+                        call.first_token()
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                call.usage(llm_telemetry.estimate_tokens(prompt), llm_telemetry.estimate_tokens(''.join(parts)), estimated=True)
 
         except Exception as e:
             yield f"Error: {str(e)}"
 
     return Response(generate(), mimetype='text/plain')
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # totais das chamadas ao LLM feitas por este processo, no formato do Prometheus
+    return Response(llm_telemetry.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=11434)
\ No newline at end of file
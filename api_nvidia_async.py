@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import httpx
+from aiohttp import web
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+import llm_telemetry
+from llm_cache import LLM_MAX_RETRIES, LLM_RETRY_BACKOFF, is_transient_error
+
+# Gateway assíncrono com o mesmo contrato de api_nvidia.py:
+# POST /generate {"prompt": "..."} -> texto em streaming (text/plain).
+#
+# - um único pool de conexões HTTP (keep-alive) com o upstream, compartilhado por todas as requisições;
+# - no máximo GATEWAY_MAX_INFLIGHT streams simultâneos para o upstream; as demais requisições
+#   esperam na fila até GATEWAY_QUEUE_TIMEOUT segundos e depois recebem 503;
+# - requisições idênticas em andamento são agrupadas: um único stream do upstream é
+#   repassado a todos os clientes que estão esperando pela mesma resposta.
+
+load_dotenv()
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://integrate.api.nvidia.com/v1")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "$API_KEY_REQUIRED_IF_EXECUTING_OUTSIDE_NGC")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "nvidia/llama-3.1-nemotron-70b-instruct")
+TEMPERATURE = float(os.getenv("TEMPERATURE", 0.5))
+TOP_P = float(os.getenv("TOP_P", 1))
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", 1024))
+
+GATEWAY_MAX_INFLIGHT = int(os.getenv("GATEWAY_MAX_INFLIGHT", 32))
+GATEWAY_QUEUE_TIMEOUT = float(os.getenv("GATEWAY_QUEUE_TIMEOUT", 30))
+GATEWAY_MAX_CONNECTIONS = int(os.getenv("GATEWAY_MAX_CONNECTIONS", 64))
+
+DEFAULT_PROMPT = "Write a limerick about the wonders of GPU computing."
+
+
+class _Broadcast:
+    """Um stream do upstream, reproduzido para cada assinante desde o primeiro trecho."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.rejected = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, chunk):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, rejected=False):
+        async with self._changed:
+            self.done = True
+            self.rejected = rejected
+            self._changed.notify_all()
+
+    async def wait_started(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.chunks or self.done)
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.chunks) > position or self.done)
+                pending = self.chunks[position:]
+                finished = self.done
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position == len(self.chunks):
+                return
+
+
+def _request_key(prompt):
+    payload = json.dumps([OPENAI_MODEL, prompt, TEMPERATURE, TOP_P, MAX_TOKENS])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _create_stream(client, call, prompt):
+    # mesmas regras de nova tentativa de llm_cache.create_completion, sem bloquear o loop
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=TEMPERATURE,
+                top_p=TOP_P,
+                max_tokens=MAX_TOKENS,
+                stream=True
+            )
+        except Exception as e:
+            if attempt == LLM_MAX_RETRIES or not is_transient_error(e):
+                raise
+            call.retry()
+            await asyncio.sleep(LLM_RETRY_BACKOFF * 2 ** attempt)
+
+
+def _estimate_usage(prompt, completion):
+    return llm_telemetry.estimate_tokens(prompt), llm_telemetry.estimate_tokens(completion)
+
+
+async def _run_upstream(app, key, prompt, broadcast):
+    try:
+        try:
+            await asyncio.wait_for(app["inflight"].acquire(), timeout=GATEWAY_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            await broadcast.finish(rejected=True)
+            return
+        try:
+            with llm_telemetry.track('api_nvidia_async', OPENAI_MODEL) as call:
+                completion = await _create_stream(app["client"], call, prompt)
+                parts = []
+                async for chunk in completion:
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        call.first_token()
+                        parts.append(chunk.choices[0].delta.content)
+                        await broadcast.publish(chunk.choices[0].delta.content)
+                # o tiktoken (carga da codificação e contagem) roda fora do event loop
+                prompt_tokens, completion_tokens = await asyncio.get_running_loop().run_in_executor(
+                    None, _estimate_usage, prompt, ''.join(parts)
+                )
+                call.usage(prompt_tokens, completion_tokens, estimated=True)
+        except Exception as e:
+            await broadcast.publish(f"Error: {str(e)}")
+        finally:
+            app["inflight"].release()
+        await broadcast.finish()
+    finally:
+        app["streams"].pop(key, None)
+
+
+async def generate_text(request):
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        data = {}
+    prompt = (data or {}).get("prompt", DEFAULT_PROMPT)
+
+    # agrupa requisições idênticas que chegam enquanto o stream anterior ainda está em andamento
+    app = request.app
+    key = _request_key(prompt)
+    broadcast = app["streams"].get(key)
+    if broadcast is None:
+        broadcast = _Broadcast()
+        app["streams"][key] = broadcast
+        # a tarefa não pertence a nenhum cliente: se um deles desconectar, os outros continuam recebendo
+        task = asyncio.create_task(_run_upstream(app, key, prompt, broadcast))
+        app["tasks"].add(task)
+        task.add_done_callback(app["tasks"].discard)
+
+    await broadcast.wait_started()
+    if broadcast.rejected:
+        return web.Response(status=503, text="Error: gateway ocupado, tente novamente.")
+
+    response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+    await response.prepare(request)
+    async for chunk in broadcast.subscribe():
+        await response.write(chunk.encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+async def metrics(request):
+    # totais das chamadas ao upstream feitas por este processo, no formato do Prometheus
+    return web.Response(text=llm_telemetry.prometheus_text(), content_type="text/plain")
+
+
+async def _start_client(app):
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=GATEWAY_MAX_CONNECTIONS,
+            max_keepalive_connections=GATEWAY_MAX_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+    )
+    app["http_client"] = http_client
+    app["client"] = AsyncOpenAI(
+        base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY, http_client=http_client, max_retries=0
+    )
+    app["inflight"] = asyncio.Semaphore(GATEWAY_MAX_INFLIGHT)
+
+
+async def _close_client(app):
+    tasks = list(app["tasks"])
+    for task in tasks:
+        task.cancel()
+    # as tarefas canceladas ainda podem estar usando o cliente: espera que terminem antes de fechá-lo
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await app["http_client"].aclose()
+
+
+def create_app():
+    app = web.Application()
+    app["streams"] = {}
+    app["tasks"] = set()
+    app.on_startup.append(_start_client)
+    app.on_cleanup.append(_close_client)
+    app.router.add_post("/generate", generate_text)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(create_app(), host='0.0.0.0', port=11434)
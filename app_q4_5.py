@@ -2,7 +2,6 @@ import os
 import streamlit as st
 import requests
 import json
-from bs4 import BeautifulSoup
 import matplotlib.pyplot as plt
 from collections import Counter
 from dotenv import load_dotenv
@@ -16,7 +15,8 @@ st.set_page_config(page_title="Gerador de Texto AI e Categorização de Manchete
 # Agora, importe as funções após a configuração da página
 from simpsons_analysis import analyze_simpsons_data
 from simpsons_sentiment_analysis import analyze_simpsons_sentiments
-from ollama_chat import ollama_chat 
+from ollama_chat import ollama_chat as ollama_chat_page, get_local_models
+from headlines import CategorizationError, ingest_headlines, categorize_headlines as categorize_headline_batches
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -29,74 +29,9 @@ def read_project_info():
     except FileNotFoundError:
         return "Informações do projeto não encontradas."
 
-# Função para obter os modelos disponíveis localmente
-def get_local_models():
-    response = requests.get("http://localhost:11434/api/tags")
-    models = []
-    if response.status_code == 200:
-        data = response.json()
-        models = [model['name'] for model in data.get('models', [])]
-    return models
-
-# Função de chat com o modelo selecionado
+# Função de chat com o modelo selecionado (streaming, com histórico; ver ollama_chat.py)
 def ollama_chat():
-    st.title("Chat com LLM (Modelo Selecionado)")
-    st.write("Interaja com a LLM servida pelo Ollama localmente na porta 11434.")
-
-    # Obter modelos disponíveis
-    models = get_local_models()
-    
-    # Selecionar modelo através de um menu dropdown
-    selected_model = st.selectbox("Selecione o modelo:", models)
-    
-    # Sessão para manter o histórico do chat
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-
-    # Campo de entrada do usuário
-    user_input = st.text_input("Digite sua mensagem", placeholder="Escreva aqui...")
-
-    if st.button("Enviar"):
-        if user_input.strip():
-            # Adicionar a entrada do usuário no histórico
-            st.session_state.chat_history.append({"role": "user", "message": user_input})
-            
-            # Enviar a mensagem para o Ollama
-            try:
-                url = "http://localhost:11434/api/chat"
-                headers = {"Content-Type": "application/json"}
-                data = {
-                    "model": selected_model,  # Usar o modelo selecionado
-                    "messages": [{"role": "user", "content": user_input}],
-                    "stream": False
-                }
-                
-                with st.spinner("Gerando resposta..."):
-                    response = requests.post(url, headers=headers, json=data)
-                    
-                    if response.status_code == 200:
-                        response_data = response.json()
-                        llm_response = response_data.get('message', {}).get('content', 'Sem resposta da LLM.')
-                        
-                        # Adicionar a resposta no histórico
-                        st.session_state.chat_history.append({"role": "assistant", "message": llm_response})
-                        
-                        # Exibir a resposta
-                        st.markdown(f"**LLM:** {llm_response}")
-                    else:
-                        st.error(f"Erro na requisição: {response.status_code}")
-                        st.error(response.text)
-            except Exception as e:
-                st.error(f"Erro ao se comunicar com o Ollama: {e}")
-        else:
-            st.warning("Digite uma mensagem antes de enviar.")
-
-    # Exibir histórico do chat
-    for entry in st.session_state.chat_history:
-        if entry["role"] == "user":
-            st.markdown(f"**Você:** {entry['message']}")
-        elif entry["role"] == "assistant":
-            st.markdown(f"**LLM:** {entry['message']}")
+    ollama_chat_page(models=get_local_models())
 
 # Função para gerador de texto AI
 def text_generation_app():
@@ -126,46 +61,13 @@ def text_generation_app():
         else:
             st.warning("Por favor, digite um prompt antes de gerar o texto.")
 
-# Função para coletar manchetes
-def get_headlines():
-    url = "https://noticias.ufal.br/"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    headlines = [h.text.strip() for h in soup.find_all('a', class_='titulo')]
-    return headlines
-
-# Função para categorizar manchetes
+# Função para categorizar manchetes (lotes paralelos com saída JSON; ver headlines.py)
 def categorize_headlines(headlines):
-    url = "http://localhost:11434/api/generate"
-    headers = {"Content-Type": "application/json"}
-    
-    prompt = """Categorize as seguintes manchetes como positiva, neutra ou negativa:
-
-Exemplos:
-1. "Estudantes da UFAL ganham prêmio nacional" - Positiva
-2. "Universidade anuncia novos cursos para o próximo semestre" - Positiva
-3. "Greve dos professores chega ao fim após acordo" - Neutra
-4. "Aulas suspensas devido a problemas de infraestrutura" - Negativa
-
-Agora, categorize estas manchetes:
-
-"""
-    prompt += "\n".join(headlines)
-
-    data = {"model": "llama3.2", "prompt": prompt, "stream": False}
-    
-    response = requests.post(url, headers=headers, json=data)
-    
-    if response.status_code == 200:
-        categorized = []
-        for line in response.text.split('\n'):
-            if ' - ' in line:
-                headline, category = line.rsplit(' - ', 1)
-                categorized.append({"headline": headline.strip(), "category": category.strip()})
-        return categorized
-    else:
-        st.error(f"Erro na categorização: {response.status_code}")
-        return []
+    try:
+        return categorize_headline_batches(headlines)
+    except CategorizationError as e:
+        st.error(f"Erro na categorização: {e}")
+        return [], e.failed_batches
 
 # Função para criar gráfico
 def create_chart(categorized):
@@ -186,8 +88,17 @@ def headline_categorization_app():
     
     if st.button("Coletar e Categorizar Manchetes"):
         with st.spinner("Coletando e categorizando manchetes..."):
-            headlines = get_headlines()
-            categorized = categorize_headlines(headlines)
+            # só as manchetes novas vão para o LLM; as demais vêm do store (ver headlines.py)
+            categorized, stats = ingest_headlines(categorize_headlines)
+            st.caption(
+                f"{stats['headlines']} manchetes, {stats['new']} novas enviadas ao LLM; "
+                f"{stats['not_modified']} de {stats['pages']} páginas sem alterações."
+            )
+            if stats['failed_batches']:
+                st.warning(
+                    f"{stats['failed_batches']} lote(s) de manchetes falharam na categorização; "
+                    "essas manchetes serão enviadas de novo na próxima coleta."
+                )
             
             if categorized:
                 fig, count = create_chart(categorized)
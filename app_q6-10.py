@@ -1,23 +1,26 @@
-import os
+import time
+
+# marcado antes dos imports: o tempo de execução do script inclui o custo deles
+script_started = time.perf_counter()
+
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-import matplotlib.pyplot as plt
 from collections import Counter
 
-import pandas as pd
-import numpy as np
-from openai import OpenAI
-
-from simpsons_analysis import analyze_episode_summary, test_api_connection, analyze_episode, summarize_episode
-from summary_metrics import compare_summaries, analyze_convergence
+from lazy_imports import lazy_import, IMPORT_TIMES
+import llm_telemetry
+import llm_cache
 from export import export_sentiment_analysis
 from sentiment_visualization import main as sentiment_viz_main
-from simpsons_sentiment_analysis import analyze_simpsons_sentiments, test_api_connection, export_to_csv
-from sentiment_visualization import main as sentiment_viz_main
 
 from dotenv import dotenv_values
 
+# Dependências pesadas são importadas só quando a aba que precisa delas é usada
+requests = lazy_import('requests')
+bs4 = lazy_import('bs4')
+plt = lazy_import('matplotlib.pyplot')
+simpsons_analysis = lazy_import('simpsons_analysis')
+sentiment_analysis = lazy_import('simpsons_sentiment_analysis')
+
 config = dotenv_values(".env")
 OPENAI_API_KEY = config["OPENAI_API_KEY"].strip()
 
@@ -35,12 +38,6 @@ if 'distribution' not in st.session_state:
 if 'num_calls' not in st.session_state:
     st.session_state.num_calls = 0
 
-# Configura o cliente nvidia
-client = OpenAI(
-    base_url=os.getenv("OPENAI_BASE_URL"),
-    api_key=os.getenv("OPENAI_API_KEY")
-)
-
 def read_project_info():
     try:
         with open('project_info.txt', 'r', encoding='utf-8') as file:
@@ -48,11 +45,22 @@ def read_project_info():
     except FileNotFoundError:
         return "Informações do projeto não encontradas."
 
+def last_stream_stats():
+    stream_stats = simpsons_analysis.STREAM_STATS
+    return stream_stats[-1] if stream_stats else None
+
+def show_stream_stats(previous):
+    # tempos da última chamada em streaming (tempo até o primeiro token e total),
+    # exibidos só se houve chamada nova (acertos de cache/artefato não geram estatística)
+    stats = last_stream_stats()
+    if stats is not None and stats is not previous and stats['ttft'] is not None:
+        st.caption(f"Primeiro token em {stats['ttft']:.2f}s · tempo total {stats['total']:.2f}s")
+
 # coletar manchetes
 def get_headlines():
     url = "https://noticias.ufal.br/"
     response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
+    soup = bs4.BeautifulSoup(response.content, 'html.parser')
     headlines = [h.text.strip() for h in soup.find_all('a', class_='titulo')]
     return headlines
 
@@ -115,12 +123,13 @@ with tab5:
     st.subheader("Análise de Sentimentos dos Simpsons")
     
     if st.button("Testar Conexão com API"):
-        if test_api_connection():
+        if sentiment_analysis.test_api_connection():
             st.success("Conexão com a API bem-sucedida!")
         else:
             st.error("Falha na conexão com a API. Verifique os logs para mais detalhes.")
     
     if not st.session_state.analysis_done:
+        use_cascade = st.checkbox("Pré-classificar com léxico (VADER) e enviar ao LLM só as falas incertas")
         if st.button("Iniciar Análise de Sentimentos"):
             with st.spinner("Analisando sentimentos dos diálogos dos Simpsons..."):
                 progress_bar = st.progress(0)
@@ -128,7 +137,7 @@ with tab5:
                 def update_progress(progress):
                     progress_bar.progress(progress)
                 
-                st.session_state.episode_lines, st.session_state.distribution, _, _, st.session_state.num_calls = analyze_simpsons_sentiments(update_progress)
+                st.session_state.episode_lines, st.session_state.distribution, _, _, st.session_state.num_calls = sentiment_analysis.analyze_simpsons_sentiments(update_progress, cascade=use_cascade)
                 
                 progress_bar.empty()
             
@@ -138,6 +147,9 @@ with tab5:
         st.success("Análise concluída!")
         st.subheader("Número de chamadas ao LLM")
         st.write(f"Foram necessárias {st.session_state.num_calls} chamadas ao LLM.")
+        stage_counts = st.session_state.episode_lines['sentiment_stage'].value_counts()
+        if 'lexicon' in stage_counts:
+            st.write(f"Falas classificadas pelo léxico: {stage_counts.get('lexicon', 0)} | pelo LLM: {stage_counts.get('llm', 0)}")
         
         st.subheader("Distribuição de Sentimentos")
         fig, ax = plt.subplots()
@@ -160,7 +172,7 @@ with tab5:
             st.write("Não há dados de sentimento disponíveis.")
         
         if st.button("Exportar Resultados para CSV"):
-            csv_path = export_to_csv(st.session_state.episode_lines)
+            csv_path = sentiment_analysis.export_to_csv(st.session_state.episode_lines)
             st.success(f"Arquivo CSV salvo em: {csv_path}")
             
             with open(csv_path, "rb") as file:
@@ -178,43 +190,47 @@ with tab7:
     st.header("Resumo do Episódio dos Simpsons")
     
     if st.button("Testar Conexão com API", key="test_api_connection_button"):
-        if test_api_connection():
+        if sentiment_analysis.test_api_connection():
             st.success("Conexão com a API bem-sucedida!")
         else:
             st.error("Falha na conexão com a API. Verifique os logs para mais detalhes.")
     
     if st.button("Analisar Episódio", key="analyze_episode_button"):
-        with st.spinner("Gerando resumo do episódio... Isso pode levar alguns minutos."):
-            summary, token_count = summarize_episode(92, 5)  # episódio 92 da temporada 5
+        st.subheader(f"Resumo do Episódio 92 da Temporada 5")
+        previous_stats = last_stream_stats()
+        # o texto aparece à medida que o modelo gera (episódio 92 da temporada 5)
+        summary = st.write_stream(simpsons_analysis.stream_reference_summary(92, 5))
+        token_count = simpsons_analysis.count_tokens(summary)
         
         st.success("Resumo gerado com sucesso!")
-        
-        st.subheader(f"Resumo do Episódio 92 da Temporada 5")
-        st.write(summary)
         st.write(f"Número de tokens no resumo: {token_count}")
+        show_stream_stats(previous_stats)
 
 
 with tab8:
     st.header("Resumo Detalhado do Episódio dos Simpsons")
     
     if st.button("Testar Conexão com API", key="test_api_connection_button_detailed"):
-        if test_api_connection():
+        if sentiment_analysis.test_api_connection():
             st.success("Conexão com a API bem-sucedida!")
         else:
             st.error("Falha na conexão com a API. Verifique os logs para mais detalhes.")
     
     if st.button("Gerar Resumo Detalhado", key="analyze_episode_detailed_button"):
-        with st.spinner("Gerando resumo detalhado do episódio... Isso pode levar alguns minutos."):
-            final_summary, num_chunks, evaluation, chunk_summaries, chunk_evaluations, reference_summary = analyze_episode_summary(92, 5)
-            
-        
-        st.success("Análise detalhada concluída!")
-
         st.subheader("Resumo de Referência")
-        st.write(reference_summary)
+        st.write_stream(simpsons_analysis.stream_reference_summary(92, 5))
         
         st.subheader("Resumo Final do Episódio")
-        st.write(final_summary)
+        with st.spinner("Resumindo os chunks do episódio... Isso pode levar alguns minutos."):
+            simpsons_analysis.get_artifact('chunk_summaries', 92, 5)
+        previous_stats = last_stream_stats()
+        st.write_stream(simpsons_analysis.stream_final_summary(92, 5))
+        show_stream_stats(previous_stats)
+        
+        with st.spinner("Avaliando os resumos..."):
+            final_summary, num_chunks, evaluation, chunk_summaries, chunk_evaluations, reference_summary = simpsons_analysis.analyze_episode_summary(92, 5)
+        
+        st.success("Análise detalhada concluída!")
         
         st.subheader("Detalhes da Análise")
         st.write(f"Número de chunks necessários: {num_chunks}")
@@ -235,11 +251,10 @@ with tab9:
     
     if st.button("Gerar Comparação", key="compare_summaries_button"):
         with st.spinner("Gerando comparação dos resumos... Isso pode levar alguns minutos."):
-            final_summary, num_chunks, _, chunk_summaries, _, reference_summary = analyze_episode_summary(92, 5)
-            
-            
-            final_metrics, chunk_metrics = compare_summaries(reference_summary, final_summary, chunk_summaries)
-            convergence_analysis, omitted_info = analyze_convergence(reference_summary, final_summary, chunk_summaries)
+            # reaproveita os resumos já gerados nas abas 7 e 8 (nesta ou em sessões anteriores)
+            final_summary = simpsons_analysis.get_artifact('final_summary', 92, 5)
+            reference_summary = simpsons_analysis.get_artifact('reference_summary', 92, 5)
+            final_metrics, chunk_metrics, convergence_analysis, omitted_info = simpsons_analysis.get_artifact('metrics', 92, 5)
         
         st.success("Comparação concluída!")
         
@@ -270,3 +285,48 @@ with tab10:
 
 with tab11:
     sentiment_viz_main()
+
+# Relatório de inicialização: tempo desta execução do script e das importações preguiçosas já feitas
+with st.sidebar.expander("Tempo de inicialização"):
+    st.write(f"Execução do script: {(time.perf_counter() - script_started) * 1000:.0f} ms")
+    for module, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1]):
+        st.write(f"import {module}: {seconds * 1000:.0f} ms")
+
+# Memória: o dataset é carregado uma vez por processo e compartilhado entre as sessões
+with st.sidebar.expander("Uso de memória"):
+    if st.button("Medir memória"):
+        shared_dataset = lazy_import('shared_dataset')
+        report = shared_dataset.memory_report(st.session_state)
+        st.write(f"Processo (RSS): {shared_dataset.format_bytes(report['process_rss'])}")
+        st.write(f"Dataset compartilhado: {shared_dataset.format_bytes(report['shared_dataset'])}")
+        st.write(f"Memória Arrow alocada: {shared_dataset.format_bytes(report['arrow_allocated'])}")
+        st.write(f"Estado desta sessão: {shared_dataset.format_bytes(report['session_state'])}")
+
+# Telemetria: totais das chamadas ao LLM feitas por este processo, por pipeline
+with st.sidebar.expander("Telemetria do LLM"):
+    cache_stats = llm_cache.stats()
+    st.write(
+        f"Cache de respostas: {cache_stats['hits']} acertos e {cache_stats['misses']} faltas neste processo; "
+        f"{cache_stats['entries']} entradas ({cache_stats['bytes'] / 1024:.0f} KB)"
+    )
+    llm_totals = llm_telemetry.totals()
+    if not llm_totals:
+        st.write("Nenhuma chamada ao LLM registrada ainda.")
+    else:
+        st.dataframe([
+            {
+                'pipeline': caller,
+                'chamadas': values['calls'],
+                'erros': values['errors'],
+                'cache': values['cached'],
+                'tentativas extras': values['retries'],
+                'tempo total (s)': round(values['wall_time'], 2),
+                'ttft médio (s)': round(values['ttft_sum'] / values['ttft_count'], 2) if values['ttft_count'] else None,
+                'tokens prompt': values['prompt_tokens'],
+                'tokens resposta': values['completion_tokens'],
+                'custo': round(values['cost'], 4),
+            }
+            for caller, values in sorted(llm_totals.items())
+        ])
+        st.download_button("Exportar JSONL", llm_telemetry.export_jsonl(), file_name="llm_telemetry.jsonl")
+        st.download_button("Exportar Prometheus", llm_telemetry.prometheus_text(), file_name="llm_metrics.prom")
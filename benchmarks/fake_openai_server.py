@@ -0,0 +1,167 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Servidor local compatível com POST /v1/chat/completions, para benchmarks sem rede.
+#
+# - latency: atraso antes da resposta (s); token_latency: atraso por token gerado (s)
+# - error_rate: fração das requisições que recebem 500 (ou 429, metade das vezes)
+# - stream=True na requisição devolve a resposta em SSE, um token por evento
+#
+# Prompts de classificação de sentimentos (linhas "<id>: <fala>" após "### Lines:")
+# recebem um JSON {"<id>": "<rótulo>"}; os demais recebem um texto de completion_words palavras.
+
+WORDS = "homer marge bart lisa maggie springfield donut plant school moe beer burns smithers flanders".split()
+LABELS = ('positive', 'neutral', 'negative')
+
+
+class FakeChatServer:
+    """
+    Servidor de chat completions em uma thread de fundo.
+
+    :param latency: Segundos antes do primeiro token
+    :param token_latency: Segundos entre tokens (também aplicado às respostas sem streaming)
+    :param error_rate: Fração das requisições respondidas com erro
+    :param completion_words: Palavras nas respostas de texto livre
+    :param seed: Semente dos rótulos, textos e erros
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, token_latency=0.0, error_rate=0.0,
+                 completion_words=60, seed=0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.completion_words = completion_words
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _content(self, prompt):
+        with self._lock:
+            if '### Lines:' in prompt:
+                ids = re.findall(r'^\s*(\d+): ', prompt.split('### Lines:', 1)[1], flags=re.MULTILINE)
+                return json.dumps({line_id: self._random.choice(LABELS) for line_id in ids})
+            return ' '.join(self._random.choices(WORDS, k=self.completion_words))
+
+    def _should_fail(self):
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                return 429 if self._random.random() < 0.5 else 500
+            return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': 'not found'}})
+                    return
+
+                time.sleep(server.latency)
+                status = server._should_fail()
+                if status:
+                    self._send_json(status, {'error': {'message': 'simulated failure', 'code': status}})
+                    return
+
+                prompt = '\n'.join(str(message.get('content', '')) for message in request.get('messages', []))
+                content = server._content(prompt)
+                tokens = re.findall(r'\S+\s*', content)
+                usage = {
+                    'prompt_tokens': len(prompt.split()),
+                    'completion_tokens': len(tokens),
+                    'total_tokens': len(prompt.split()) + len(tokens),
+                }
+                model = request.get('model', 'fake-model')
+
+                if not request.get('stream'):
+                    time.sleep(server.token_latency * len(tokens))
+                    self._send_json(200, {
+                        'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                        'usage': usage,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(server.token_latency)
+                    chunk = {
+                        'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                        'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatível com a API de chat completions.")
+    parser.add_argument('--port', type=int, default=18000)
+    parser.add_argument('--latency', type=float, default=0.05, help="Segundos antes da resposta")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="Segundos por token gerado")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fração das requisições com erro")
+    args = parser.parse_args()
+
+    server = FakeChatServer(port=args.port, latency=args.latency, token_latency=args.token_latency,
+                            error_rate=args.error_rate)
+    print(f"Servidor em {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import headlines
+
+# Verificação da coleta incremental de manchetes contra um site local, sem rede.
+#
+# O servidor publica páginas de listagem com ETag e responde 304 às requisições
+# condicionais cujo If-None-Match ainda vale. A verificação roda três coletas:
+#
+#   1. store vazio: todas as páginas respondem 200 e todas as manchetes são categorizadas
+#   2. nada mudou: todas as páginas respondem 304 e nada é enviado ao categorizador
+#   3. uma página ganha manchetes: só ela responde 200 e só as manchetes novas são categorizadas
+#
+#   python -m benchmarks.headlines_fixture --pages 3 --headlines-per-page 20
+
+
+def listing_html(titles):
+    links = '\n'.join(f'<li><a class="titulo" href="#{i}">{title}</a></li>' for i, title in enumerate(titles))
+    return f"<html><body><ul>\n{links}\n</ul></body></html>".encode('utf-8')
+
+
+class FixtureSite:
+    """
+    Site de manchetes em uma thread de fundo.
+
+    :param pages: {caminho: lista de manchetes}; pode ser alterado com set_page
+    """
+
+    def __init__(self, pages, host='127.0.0.1', port=0):
+        self.statuses = []
+        self._pages = {}
+        self._lock = threading.Lock()
+        for path, titles in pages.items():
+            self.set_page(path, titles)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def set_page(self, path, titles):
+        body = listing_html(titles)
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        with self._lock:
+            self._pages[path] = (etag, body)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, etag=None, body=b''):
+                with site._lock:
+                    site.statuses.append((self.path, status))
+                self.send_response(status)
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with site._lock:
+                    page = site._pages.get(self.path)
+                if page is None:
+                    self._send(404)
+                    return
+                etag, body = page
+                if self.headers.get('If-None-Match') == etag:
+                    self._send(304, etag)
+                    return
+                self._send(200, etag, body)
+
+        return Handler
+
+
+class RecordingCategorizer:
+    """Categorizador local que registra as manchetes recebidas em cada chamada."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, titles):
+        self.calls.append(list(titles))
+        return [{"headline": title, "category": "Neutra"} for title in titles], 0
+
+
+def _collect(site, urls, store):
+    site.statuses.clear()
+    categorize = RecordingCategorizer()
+    result, stats = headlines.ingest_headlines(categorize, urls=urls, store=store)
+    statuses = sorted(status for _, status in site.statuses)
+    sent = [title for call in categorize.calls for title in call]
+    return result, stats, statuses, sent
+
+
+def check(pages=3, headlines_per_page=20, added=2):
+    """
+    Executa as três coletas e confere os status HTTP e as manchetes enviadas ao categorizador.
+
+    :raises AssertionError: Se a coleta incremental não se comportar como esperado
+    :return: Lista de (etapa, stats) de cada coleta
+    """
+    contents = {
+        f"/pagina/{page}": [f"Manchete {page}.{i} da UFAL" for i in range(headlines_per_page)]
+        for page in range(pages)
+    }
+    total = pages * headlines_per_page
+    report = []
+
+    with tempfile.TemporaryDirectory() as directory, FixtureSite(contents) as site:
+        urls = [site.base_url.rstrip('/') + path for path in contents]
+        store = headlines.HeadlineStore(os.path.join(directory, 'headlines.sqlite'))
+
+        result, stats, statuses, sent = _collect(site, urls, store)
+        assert statuses == [200] * pages, statuses
+        assert len(sent) == total and len(result) == total, (len(sent), len(result))
+        assert stats['not_modified'] == 0 and stats['new'] == total, stats
+        report.append(('primeira coleta', stats))
+
+        result, stats, statuses, sent = _collect(site, urls, store)
+        assert statuses == [304] * pages, statuses
+        assert sent == [] and len(result) == total, (sent, len(result))
+        assert stats['not_modified'] == pages and stats['new'] == 0, stats
+        report.append(('sem alterações', stats))
+
+        changed = next(iter(contents))
+        new_titles = [f"Manchete nova {i} da UFAL" for i in range(added)]
+        site.set_page(changed, new_titles + contents[changed])
+        result, stats, statuses, sent = _collect(site, urls, store)
+        assert statuses == sorted([200] + [304] * (pages - 1)), statuses
+        assert sent == new_titles, sent
+        assert len(result) == total + added and stats['new'] == added, (len(result), stats)
+        report.append(('página alterada', stats))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica a coleta incremental de manchetes contra um site local.")
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--headlines-per-page', type=int, default=20)
+    parser.add_argument('--added', type=int, default=2, help="Manchetes novas na página alterada")
+    args = parser.parse_args()
+
+    for step, stats in check(args.pages, args.headlines_per_page, args.added):
+        print(f"{step}: {stats}")
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import random
+import sys
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import summary_metrics
+from benchmarks.fake_openai_server import WORDS
+
+# Verificação de regressão das métricas de resumo: summary_metrics.score_batch deve dar
+# os mesmos valores que o sentence_bleu do nltk e o pacote rouge (usados antes do cálculo
+# em lote), em textos sintéticos e em casos de borda da separação de frases e palavras.
+#
+#   python -m benchmarks.metrics_check --texts 200
+
+TOLERANCE = 1e-9
+
+EDGE_CASES = [
+    "homer bebe cerveja. marge cozinha. bart bart bart.",
+    "sem ponto final nenhum aqui",
+    "a. . b",
+    "espaços   duplos.  e\tquebras\nde linha. ",
+    "homer, marge e bart. homer, marge e lisa.",
+    "...",
+    "",
+]
+
+
+def synthetic_text(rng, sentences):
+    words = WORDS + [word + ',' for word in WORDS[:4]]
+    return ' '.join(
+        ' '.join(rng.choices(words, k=rng.randint(1, 25))) + '.'
+        for _ in range(sentences)
+    )
+
+
+def expected_scores(reference, hypothesis):
+    from nltk.translate.bleu_score import sentence_bleu
+    from rouge import Rouge
+
+    with warnings.catch_warnings():
+        # o nltk avisa quando alguma ordem de n-grama não tem acertos (o BLEU é 0)
+        warnings.simplefilter('ignore')
+        bleu = sentence_bleu([reference.split()], hypothesis.split()) if hypothesis.split() else 0.0
+    try:
+        rouge = Rouge().get_scores(hypothesis, reference)[0]
+    except ValueError:
+        # texto sem frases: o pacote rouge recusa, score_batch devolve 0
+        rouge = {name: {'f': 0.0} for name in ('rouge-1', 'rouge-2', 'rouge-l')}
+    return {
+        'bleu': bleu,
+        'rouge-1': rouge['rouge-1']['f'],
+        'rouge-2': rouge['rouge-2']['f'],
+        'rouge-l': rouge['rouge-l']['f'],
+    }
+
+
+def check(texts=200, seed=0):
+    """
+    Compara score_batch com o nltk e o pacote rouge.
+
+    :raises AssertionError: Se algum valor diferir mais que TOLERANCE
+    :return: Número de pares (referência, resumo) comparados
+    """
+    rng = random.Random(seed)
+    references = [synthetic_text(rng, rng.randint(1, 12)) for _ in range(5)] + EDGE_CASES[:5]
+    hypotheses = [synthetic_text(rng, rng.randint(1, 6)) for _ in range(texts)] + EDGE_CASES
+
+    compared = 0
+    for reference in references:
+        scores = summary_metrics.score_batch(reference, hypotheses)
+        for hypothesis, (_, row) in zip(hypotheses, scores.iterrows()):
+            expected = expected_scores(reference, hypothesis)
+            for name in summary_metrics.METRIC_NAMES:
+                assert abs(row[name] - expected[name]) <= TOLERANCE, (name, row[name], expected[name], reference, hypothesis)
+            compared += 1
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara summary_metrics.score_batch com o nltk e o pacote rouge.")
+    parser.add_argument('--texts', type=int, default=200, help="Resumos sintéticos por referência")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{check(args.texts, args.seed)} pares comparados")
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_openai_server import FakeChatServer
+from benchmarks import synthetic_data
+
+# Benchmarks dos caminhos críticos do projeto, com dados sintéticos e um servidor de chat local.
+#
+# Cada estágio é executado --repeat vezes sem instrumentação (tempo, vazão e percentis de
+# latência por unidade) e mais uma vez sob tracemalloc (pico de memória). O resultado é
+# gravado em JSON, com o commit atual, para comparar execuções:
+#
+#   python -m benchmarks.run --episodes 300 --latency 0.02
+#   python -m benchmarks.run --compare benchmarks/results/<antes>.json benchmarks/results/<depois>.json
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def measure(func, units, repeat):
+    """
+    Executa func(unit) para cada unidade, repeat vezes, e depois uma vez sob tracemalloc.
+
+    func retorna o número de itens processados (linhas, tokens, pares...), usado na vazão.
+    """
+    latencies, items, elapsed = [], 0, 0.0
+    for _ in range(repeat):
+        for unit in units:
+            start = time.perf_counter()
+            items += func(unit)
+            latency = time.perf_counter() - start
+            latencies.append(latency)
+            elapsed += latency
+
+    # a instrumentação do tracemalloc deixa o código mais lento: por isso fica numa passada separada
+    tracemalloc.start()
+    for unit in units:
+        func(unit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'calls': len(latencies),
+        'items': items,
+        'seconds': elapsed,
+        'throughput': items / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_memory_mb': peak / 2 ** 20,
+    }
+
+
+def _configure_environment(workdir, server):
+    # tudo o que os módulos gravam em disco fica no diretório temporário, e o LLM é o servidor local
+    os.environ.update({
+        'SIMPSONS_DATA_DIR': os.path.join(workdir, 'data'),
+        'SIMPSONS_CACHE_DIR': os.path.join(workdir, 'data', 'cache'),
+        'ARTIFACTS_DIR': os.path.join(workdir, 'data', 'cache', 'artifacts'),
+        'LLM_CACHE_PATH': os.path.join(workdir, 'data', 'cache', 'llm_responses.sqlite'),
+        'LLM_CACHE_DISABLED': '1',
+        'OPENAI_BASE_URL': server.base_url,
+        'OPENAI_API_KEY': 'benchmark',
+        'OPENAI_MODEL': 'fake-model',
+        'TEMPERATURE': '0.5',
+        'TOP_P': '1.0',
+        'MAX_TOKENS': '1024',
+    })
+
+
+def _point_at(module, server):
+    # simpsons_analysis carrega o .env com override=True: garante que nenhum benchmark chame a API real
+    module.OPENAI_BASE_URL = server.base_url
+    module.OPENAI_API_KEY = 'benchmark'
+    module.OPENAI_MODEL = 'fake-model'
+    module._client = None
+
+
+def run_benchmarks(episodes=300, lines_per_episode=250, llm_episodes=3, repeat=3, max_workers=4,
+                   latency=0.02, token_latency=0.0, error_rate=0.0):
+    """
+    Executa todos os estágios e devolve o relatório (dict serializável em JSON).
+
+    :param episodes: Episódios do corpus sintético
+    :param lines_per_episode: Média de falas por episódio
+    :param llm_episodes: Episódios usados nos estágios que chamam o LLM
+    :param repeat: Repetições de cada estágio
+    :param max_workers: Chamadas simultâneas ao LLM (LLM_MAX_WORKERS)
+    :param latency: Latência do servidor local antes da resposta (s)
+    :param token_latency: Latência do servidor local por token (s)
+    :param error_rate: Fração das requisições que o servidor local responde com erro
+    """
+    workdir = tempfile.mkdtemp(prefix='simpsons-bench-')
+    server = FakeChatServer(latency=latency, token_latency=token_latency, error_rate=error_rate).start()
+    try:
+        _configure_environment(workdir, server)
+        os.environ['LLM_MAX_WORKERS'] = str(max_workers)
+        _, _, total_lines = synthetic_data.generate(
+            os.environ['SIMPSONS_DATA_DIR'], episodes=episodes, lines_per_episode=lines_per_episode
+        )
+
+        import simpsons_data
+        import simpsons_tokens
+        import simpsons_analysis
+        import simpsons_sentiment_analysis
+        import summary_metrics
+        _point_at(simpsons_analysis, server)
+        _point_at(simpsons_sentiment_analysis, server)
+        # o módulo de sentimentos configura o logging em DEBUG e registraria cada resposta
+        logging.getLogger().setLevel(logging.WARNING)
+
+        stages = {}
+
+        def csv_load_merge(_):
+            simpsons_data.build_snapshot()
+            simpsons_data._tables.clear()
+            return total_lines
+        stages['csv_load_merge'] = measure(csv_load_merge, [None], repeat)
+
+        spoken = simpsons_data.load_simpsons_data(columns=['spoken_words'])['spoken_words'].dropna().tolist()
+
+        def count_tokens(_):
+            simpsons_tokens.count_tokens_batch(spoken)
+            return len(spoken)
+        stages['count_tokens'] = measure(count_tokens, [None], repeat)
+
+        episode_keys = simpsons_data.list_episodes()
+        episode_texts = [
+            simpsons_data.get_episode_lines(season, episode_id, columns=['spoken_words'])['spoken_words'].dropna().tolist()
+            for season, episode_id in episode_keys
+        ]
+
+        def create_chunks(lines):
+            simpsons_analysis.create_chunks(lines)
+            return len(lines)
+        stages['create_chunks'] = measure(create_chunks, episode_texts, repeat)
+
+        llm_keys = episode_keys[:llm_episodes]
+
+        def sentiment(key):
+            classified = simpsons_sentiment_analysis.analyze_simpsons_sentiments(season=key[0], episode_id=key[1])[0]
+            return len(classified)
+        stages['analyze_simpsons_sentiments'] = measure(sentiment, llm_keys, repeat)
+
+        def summarize(key):
+            _, num_chunks, _ = simpsons_analysis.summarize_episode_chunks(key[1], key[0])
+            return num_chunks
+        stages['summarize_episode_chunks'] = measure(summarize, llm_keys, repeat)
+
+        reference = ' '.join(episode_texts[0][:200])
+        hypotheses = [' '.join(lines[:60]) for lines in episode_texts]
+
+        def calculate_metrics(hypothesis):
+            summary_metrics.calculate_metrics(reference, hypothesis)
+            return 1
+        stages['calculate_metrics'] = measure(calculate_metrics, hypotheses, repeat)
+
+        def score_batch(_):
+            summary_metrics.score_batch(reference, hypotheses)
+            return len(hypotheses)
+        stages['score_batch'] = measure(score_batch, [None], repeat)
+
+        return {
+            'commit': _git_commit(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'config': {
+                'episodes': episodes, 'lines': total_lines, 'llm_episodes': llm_episodes, 'repeat': repeat,
+                'max_workers': max_workers, 'latency': latency, 'token_latency': token_latency,
+                'error_rate': error_rate,
+            },
+            'server': {'requests': server.requests, 'errors': server.errors},
+            'stages': stages,
+        }
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_report(report, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = report['timestamp'].replace(':', '').replace('-', '')
+    path = os.path.join(results_dir, f"{stamp}_{report['commit']}.json")
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    return path
+
+
+def print_report(report):
+    print(f"commit {report['commit']} | {report['config']['lines']} falas | "
+          f"{report['server']['requests']} requisições ao servidor local ({report['server']['errors']} com erro)")
+    print(f"{'estágio':<30} {'itens/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'pico MB':>10}")
+    for name, stage in report['stages'].items():
+        print(f"{name:<30} {stage['throughput']:>12.1f} {stage['p50_ms']:>10.2f} {stage['p95_ms']:>10.2f} "
+              f"{stage['p99_ms']:>10.2f} {stage['peak_memory_mb']:>10.2f}")
+
+
+def compare_reports(before, after):
+    """Imprime a variação de vazão, p95 e memória de cada estágio entre dois relatórios."""
+    print(f"{before['commit']} -> {after['commit']}")
+    print(f"{'estágio':<30} {'vazão':>10} {'p95':>10} {'memória':>10}")
+    for name, stage in after['stages'].items():
+        if name not in before['stages']:
+            continue
+        old = before['stages'][name]
+
+        def change(key):
+            return f"{(stage[key] / old[key] - 1) * 100:+.1f}%" if old[key] else 'n/a'
+
+        print(f"{name:<30} {change('throughput'):>10} {change('p95_ms'):>10} {change('peak_memory_mb'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks dos estágios de dados, tokens, LLM e métricas.")
+    parser.add_argument('--episodes', type=int, default=300)
+    parser.add_argument('--lines-per-episode', type=int, default=250)
+    parser.add_argument('--llm-episodes', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.02, help="Latência do servidor local (s)")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="Latência por token do servidor local (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fração de requisições com erro")
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DEPOIS'), help="Compara dois relatórios JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as before, open(args.compare[1], encoding='utf-8') as after:
+            compare_reports(json.load(before), json.load(after))
+        return
+
+    report = run_benchmarks(args.episodes, args.lines_per_episode, args.llm_episodes, args.repeat,
+                            args.max_workers, args.latency, args.token_latency, args.error_rate)
+    print_report(report)
+    print(f"Resultado gravado em {save_report(report, args.results_dir)}")
+
+
+if __name__ == '__main__':
+    main()
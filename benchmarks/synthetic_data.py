@@ -0,0 +1,97 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Gera CSVs sintéticos com o mesmo esquema de data/simpsons_episodes.csv e
+# data/simpsons_script_lines.csv, em qualquer escala, para os benchmarks.
+
+WORDS = np.array(
+    "homer marge bart lisa maggie doh woohoo donut springfield plant school moe beer burns "
+    "smithers flanders happy sad great terrible love hate the a of and to is in it you".split()
+)
+CHARACTERS = np.array(['Homer Simpson', 'Marge Simpson', 'Bart Simpson', 'Lisa Simpson', 'Moe Szyslak', 'C. Montgomery Burns'])
+LOCATIONS = np.array(['Simpson Home', "Moe's Tavern", 'Springfield Elementary School', 'Springfield Nuclear Power Plant'])
+
+
+def generate(output_dir, episodes=600, lines_per_episode=250, episodes_per_season=22, seed=0):
+    """
+    Grava simpsons_episodes.csv e simpsons_script_lines.csv em output_dir.
+
+    As falas são gravadas embaralhadas, como no CSV original (que não vem ordenado por episódio).
+
+    :param episodes: Número de episódios
+    :param lines_per_episode: Média de falas por episódio
+    :return: (caminho dos episódios, caminho das falas, número de falas)
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    episode_ids = np.arange(1, episodes + 1)
+    episode_frame = pd.DataFrame({
+        'id': episode_ids,
+        'image_url': 'http://example.com/image.png',
+        'imdb_rating': rng.uniform(5.0, 9.5, episodes).round(1),
+        'imdb_votes': rng.integers(500, 5000, episodes),
+        'number_in_season': (episode_ids - 1) % episodes_per_season + 1,
+        'number_in_series': episode_ids,
+        'original_air_date': '1990-01-01',
+        'original_air_year': 1990 + (episode_ids - 1) // episodes_per_season,
+        'production_code': [f"{i:04d}" for i in episode_ids],
+        'season': (episode_ids - 1) // episodes_per_season + 1,
+        'title': [f"Episode {i}" for i in episode_ids],
+        'us_viewers_in_millions': rng.uniform(5.0, 30.0, episodes).round(2),
+        'video_url': 'http://example.com/video',
+        'views': rng.integers(1000, 100000, episodes),
+    })
+
+    counts = rng.poisson(lines_per_episode, episodes).clip(min=1)
+    total = int(counts.sum())
+    owners = np.repeat(episode_ids, counts)
+    numbers = np.concatenate([np.arange(count) for count in counts])
+
+    lengths = rng.integers(1, 20, total)
+    words = WORDS[rng.integers(0, len(WORDS), int(lengths.sum()))]
+    spoken = [' '.join(part) for part in np.split(words, np.cumsum(lengths)[:-1])]
+    spoken = pd.Series(spoken, dtype=object)
+    # ~10% das linhas são rubricas, sem fala
+    stage_direction = rng.random(total) < 0.1
+    spoken[stage_direction] = None
+
+    script_frame = pd.DataFrame({
+        'id': np.arange(1, total + 1),
+        'episode_id': owners,
+        'number': numbers,
+        'raw_text': spoken,
+        'timestamp_in_ms': numbers * 1000,
+        'speaking_line': ~stage_direction,
+        'character_id': rng.integers(1, len(CHARACTERS) + 1, total),
+        'location_id': rng.integers(1, len(LOCATIONS) + 1, total),
+        'raw_character_text': CHARACTERS[rng.integers(0, len(CHARACTERS), total)],
+        'raw_location_text': LOCATIONS[rng.integers(0, len(LOCATIONS), total)],
+        'spoken_words': spoken,
+        'normalized_text': spoken.str.lower(),
+        'word_count': np.where(stage_direction, np.nan, lengths),
+    }).sample(frac=1.0, random_state=seed)
+
+    episodes_path = os.path.join(output_dir, 'simpsons_episodes.csv')
+    script_lines_path = os.path.join(output_dir, 'simpsons_script_lines.csv')
+    episode_frame.to_csv(episodes_path, index=False)
+    script_frame.to_csv(script_lines_path, index=False)
+    return episodes_path, script_lines_path, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera CSVs sintéticos de episódios e falas de The Simpsons.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--episodes', type=int, default=600)
+    parser.add_argument('--lines-per-episode', type=int, default=250)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    _, _, total = generate(args.output_dir, args.episodes, args.lines_per_episode, seed=args.seed)
+    print(f"{args.episodes} episódios, {total} falas em {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import synthetic_data
+
+# Verificação da atualização incremental do cubo de tokens (simpsons_tokens.load_token_stats).
+#
+# Grava um corpus sintético sem as falas mais recentes, monta o cubo, acrescenta as
+# falas (parte de um episódio já existente e episódios novos) e confere que a tabela
+# atualizada incrementalmente é idêntica, tipos inclusive, à reconstruída do zero.
+#
+#   python -m benchmarks.token_stats_check --episodes 120 --new-fraction 0.1
+
+
+def check(episodes=120, lines_per_episode=80, new_fraction=0.1):
+    """
+    :raises AssertionError: Se o caminho incremental não for usado ou divergir da reconstrução
+    :return: (falas iniciais, falas novas)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['SIMPSONS_DATA_DIR'] = directory
+        os.environ['SIMPSONS_CACHE_DIR'] = os.path.join(directory, 'cache')
+        episodes_path, script_lines_path, total = synthetic_data.generate(
+            directory, episodes=episodes, lines_per_episode=lines_per_episode
+        )
+        import simpsons_data
+        import simpsons_tokens
+
+        # as falas têm ids crescentes por episódio: as últimas completam um episódio e formam os seguintes
+        script_lines = pd.read_csv(script_lines_path, low_memory=False)
+        cutoff = int(total * (1 - new_fraction))
+        script_lines[script_lines['id'] <= cutoff].to_csv(script_lines_path, index=False)
+        simpsons_tokens.load_token_stats()
+
+        script_lines.to_csv(script_lines_path, index=False)
+        rebuilds = []
+        build_token_stats = simpsons_tokens.build_token_stats
+        simpsons_tokens.build_token_stats = lambda lines: rebuilds.append(len(lines)) or build_token_stats(lines)
+        try:
+            incremental, _ = simpsons_tokens.load_token_stats()
+        finally:
+            simpsons_tokens.build_token_stats = build_token_stats
+        assert not rebuilds, "a tabela foi reconstruída em vez de atualizada"
+
+        lines = simpsons_data.load_simpsons_data(columns=simpsons_data.columns_for('token_stats'))
+        lines['tokens'] = simpsons_tokens.load_token_counts().to_numpy()
+        rebuilt = simpsons_tokens.build_token_stats(lines[lines['season'].notna()])
+        pd.testing.assert_frame_equal(incremental, rebuilt, check_dtype=True, check_index_type=True)
+    return cutoff, total - cutoff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara o cubo de tokens incremental com a reconstrução completa.")
+    parser.add_argument('--episodes', type=int, default=120)
+    parser.add_argument('--lines-per-episode', type=int, default=80)
+    parser.add_argument('--new-fraction', type=float, default=0.1, help="Fração das falas acrescentadas depois")
+    args = parser.parse_args()
+
+    initial, added = check(args.episodes, args.lines_per_episode, args.new_fraction)
+    print(f"{initial} falas iniciais, {added} novas")
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
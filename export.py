@@ -1,5 +1,7 @@
 import streamlit as st
-import pandas as pd
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
 
 def export_sentiment_analysis():
     st.header("Exportar Análise de Sentimento")
@@ -0,0 +1,383 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+
+import llm_telemetry
+from ollama_chat import OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, get_session
+from translation import text_hash
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# Coleta incremental de manchetes.
+# As páginas de listagem são baixadas em paralelo com requisições condicionais
+# (If-None-Match / If-Modified-Since): uma resposta 304 reaproveita as manchetes já
+# extraídas daquela página. As manchetes categorizadas ficam num SQLite, e só as
+# novas são enviadas ao LLM.
+#
+# A categorização divide as manchetes em lotes limitados por tokens e envia os lotes
+# em paralelo ao Ollama (/api/generate com format "json"). Cada manchete vai numerada
+# e a resposta {"<id>": "<categoria>"} volta para as manchetes pelo id. Para o Ollama
+# atender os lotes ao mesmo tempo, o servidor precisa de OLLAMA_NUM_PARALLEL > 1.
+
+HEADLINES_BASE_URL = os.getenv('HEADLINES_BASE_URL', 'https://noticias.ufal.br/')
+# páginas de listagem adicionais, separadas por vírgula (relativas à base ou absolutas)
+HEADLINES_PAGES = os.getenv('HEADLINES_PAGES', '')
+HEADLINES_STORE_PATH = os.getenv('HEADLINES_STORE_PATH', os.path.join('data', 'cache', 'headlines.sqlite'))
+HEADLINES_MAX_WORKERS = int(os.getenv('HEADLINES_MAX_WORKERS', '4'))
+HEADLINES_TIMEOUT = float(os.getenv('HEADLINES_TIMEOUT', '10'))
+# classe dos links de manchete na página de listagem
+HEADLINE_CLASS = 'titulo'
+# categorização: tokens de manchetes por lote e lotes simultâneos
+HEADLINES_BATCH_TOKENS = int(os.getenv('HEADLINES_BATCH_TOKENS', '400'))
+HEADLINES_CATEGORIZE_WORKERS = int(os.getenv('HEADLINES_CATEGORIZE_WORKERS', '4'))
+HEADLINE_CATEGORIES = ('Positiva', 'Neutra', 'Negativa')
+# tokens do id ("12: ") e da quebra de linha de cada manchete
+HEADLINE_ID_TOKENS = 4
+
+CATEGORIZE_PROMPT = """Categorize cada uma das manchetes numeradas abaixo como Positiva, Neutra ou Negativa.
+
+Exemplos:
+"Estudantes da UFAL ganham prêmio nacional" - Positiva
+"Universidade anuncia novos cursos para o próximo semestre" - Positiva
+"Greve dos professores chega ao fim após acordo" - Neutra
+"Aulas suspensas devido a problemas de infraestrutura" - Negativa
+
+Responda apenas com um objeto JSON que associa o número de cada manchete à sua categoria,
+por exemplo {{"1": "Positiva", "2": "Neutra"}}. Não repita as manchetes.
+
+Manchetes:
+{headlines}
+"""
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        return _session
+
+
+def listing_urls(base_url=None, pages=None):
+    """
+    URLs das páginas de listagem: a base seguida das páginas adicionais.
+
+    :param base_url: URL base (padrão: HEADLINES_BASE_URL)
+    :param pages: Lista de caminhos ou URLs (padrão: HEADLINES_PAGES)
+    """
+    base_url = base_url or HEADLINES_BASE_URL
+    if pages is None:
+        pages = [page.strip() for page in HEADLINES_PAGES.split(',') if page.strip()]
+    return [base_url] + [urljoin(base_url, page) for page in pages]
+
+
+def parse_headlines(content):
+    """
+    Extrai os textos dos links <a class="titulo"> de uma página.
+
+    Usa o lxml quando disponível; senão, o html.parser do BeautifulSoup restrito aos links.
+
+    :param content: HTML (bytes ou str)
+    :return: Lista de manchetes, na ordem da página
+    """
+    if lxml_html is not None:
+        document = lxml_html.fromstring(content)
+        links = document.xpath(f"//a[contains(concat(' ', normalize-space(@class), ' '), ' {HEADLINE_CLASS} ')]")
+        texts = [link.text_content() for link in links]
+    else:
+        # o filtro por classe fica no find_all: durante o parse a classe ainda não foi separada em valores
+        soup = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer('a'))
+        texts = [link.get_text() for link in soup.find_all('a', class_=HEADLINE_CLASS)]
+    headlines = [' '.join(text.split()) for text in texts]
+    return [headline for headline in headlines if headline]
+
+
+class HeadlineStore:
+    """
+    Estado da coleta em SQLite: validadores e manchetes de cada página, e as categorias já atribuídas.
+
+    :param path: Arquivo SQLite
+    """
+
+    def __init__(self, path=HEADLINES_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS pages ('
+                    ' url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headlines TEXT NOT NULL)'
+                )
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS headlines ('
+                    ' text_hash TEXT PRIMARY KEY, headline TEXT NOT NULL, category TEXT NOT NULL,'
+                    ' categorized_at REAL NOT NULL)'
+                )
+                yield connection
+        finally:
+            connection.close()
+
+    def page(self, url):
+        """:return: (etag, last_modified, manchetes) da última resposta da página, ou None"""
+        with self._lock, self._transaction() as connection:
+            row = connection.execute(
+                'SELECT etag, last_modified, headlines FROM pages WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def save_page(self, url, etag, last_modified, headlines):
+        with self._lock, self._transaction() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO pages (url, etag, last_modified, headlines) VALUES (?, ?, ?, ?)',
+                (url, etag, last_modified, json.dumps(headlines, ensure_ascii=False)),
+            )
+
+    def categories(self, headlines):
+        """:return: {manchete: categoria} das manchetes já categorizadas"""
+        hashes = {text_hash(headline): headline for headline in headlines}
+        found = {}
+        with self._lock, self._transaction() as connection:
+            keys = list(hashes)
+            # consulta em blocos para não passar do limite de parâmetros do SQLite
+            for start in range(0, len(keys), 500):
+                block = keys[start:start + 500]
+                rows = connection.execute(
+                    f'SELECT text_hash, category FROM headlines WHERE text_hash IN ({",".join("?" * len(block))})',
+                    block,
+                ).fetchall()
+                found.update({hashes[key]: category for key, category in rows})
+        return found
+
+    def save_categories(self, categorized):
+        """:param categorized: Lista de {"headline": ..., "category": ...}"""
+        now = time.time()
+        with self._lock, self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO headlines (text_hash, headline, category, categorized_at) VALUES (?, ?, ?, ?)',
+                [(text_hash(item['headline']), item['headline'], item['category'], now) for item in categorized],
+            )
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=None):
+    """Store compartilhado do arquivo informado (padrão: HEADLINES_STORE_PATH)."""
+    path = path or HEADLINES_STORE_PATH
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = HeadlineStore(path)
+        return _stores[path]
+
+
+def fetch_page(url, store):
+    """
+    Baixa uma página de listagem com requisição condicional.
+
+    :return: (manchetes, True se a página não mudou desde a última coleta)
+    """
+    cached = store.page(url)
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    response = _get_session().get(url, headers=headers, timeout=HEADLINES_TIMEOUT)
+    if response.status_code == 304 and cached:
+        return cached[2], True
+    response.raise_for_status()
+
+    headlines = parse_headlines(response.content)
+    store.save_page(url, response.headers.get('ETag'), response.headers.get('Last-Modified'), headlines)
+    return headlines, False
+
+
+def fetch_headlines(urls=None, store=None, max_workers=HEADLINES_MAX_WORKERS):
+    """
+    Coleta as manchetes de todas as páginas de listagem, em paralelo.
+
+    :param urls: Páginas de listagem (padrão: listing_urls())
+    :param store: HeadlineStore (padrão: get_store())
+    :return: (manchetes sem repetição, na ordem das páginas; número de páginas sem alterações)
+    """
+    urls = urls or listing_urls()
+    store = store or get_store()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        results = list(executor.map(lambda url: fetch_page(url, store), urls))
+    headlines = list(dict.fromkeys(headline for page, _ in results for headline in page))
+    not_modified = sum(unchanged for _, unchanged in results)
+    return headlines, not_modified
+
+
+def plan_batches(headlines, batch_tokens=HEADLINES_BATCH_TOKENS):
+    """
+    Agrupa as manchetes em lotes limitados por tokens.
+
+    :param headlines: Lista de manchetes
+    :param batch_tokens: Tokens de manchetes por lote
+    :return: Lista de lotes; cada lote é uma lista de pares (posição em headlines, manchete)
+    """
+    batches = []
+    batch, tokens = [], 0
+    for position, headline in enumerate(headlines):
+        cost = llm_telemetry.count_tokens(headline) + HEADLINE_ID_TOKENS
+        if batch and tokens + cost > batch_tokens:
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append((position, headline))
+        tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _normalize_category(category):
+    category = str(category).strip().lower()
+    for name in HEADLINE_CATEGORIES:
+        # aceita variações como "positivo" ou "negative"
+        if category[:3] == name[:3].lower():
+            return name
+    return None
+
+
+class CategorizationError(Exception):
+    """Todos os lotes da categorização falharam; failed_batches diz quantos eram."""
+
+    def __init__(self, error, failed_batches):
+        super().__init__(str(error))
+        self.failed_batches = failed_batches
+
+
+def _categorize_batch(batch, model):
+    """
+    Envia um lote ao Ollama e devolve {posição: categoria} das manchetes classificadas.
+
+    :raises ValueError: Se a resposta não for um objeto JSON (o lote conta como falho)
+    """
+    numbered = '\n'.join(f"{i}: {headline}" for i, (_, headline) in enumerate(batch, start=1))
+    data = {
+        "model": model,
+        "prompt": CATEGORIZE_PROMPT.format(headlines=numbered),
+        "format": "json",
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"temperature": 0},
+    }
+    with llm_telemetry.track('categorize_headlines', model) as call:
+        response = get_session().post(f"{OLLAMA_BASE_URL}/api/generate", json=data,
+                                      timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT))
+        response.raise_for_status()
+        result = response.json()
+        call.usage(result.get('prompt_eval_count'), result.get('eval_count'))
+
+    parsed = json.loads(result.get('response', ''))
+    if not isinstance(parsed, dict):
+        raise ValueError(f"Resposta do Ollama não é um objeto JSON: {type(parsed).__name__}")
+    categories = {}
+    for line_id, category in parsed.items():
+        try:
+            index = int(line_id) - 1
+        except (TypeError, ValueError):
+            continue
+        category = _normalize_category(category)
+        if 0 <= index < len(batch) and category:
+            categories[batch[index][0]] = category
+    return categories
+
+
+def categorize_headlines(headlines, model=None, batch_tokens=HEADLINES_BATCH_TOKENS,
+                         max_workers=HEADLINES_CATEGORIZE_WORKERS):
+    """
+    Categoriza manchetes como Positiva, Neutra ou Negativa, em lotes paralelos.
+
+    Um lote que falha (erro de rede/HTTP ou resposta que não é um objeto JSON) não
+    interrompe os demais; as manchetes dele ficam de fora do resultado (e, no
+    ingest_headlines, são enviadas de novo na próxima coleta).
+
+    :param headlines: Lista de manchetes
+    :param model: Modelo do Ollama (padrão: OLLAMA_MODEL)
+    :return: (lista de {"headline": ..., "category": ...} na ordem de headlines, número de lotes que falharam)
+    :raises CategorizationError: Se todos os lotes falharem
+    """
+    model = model or OLLAMA_MODEL
+    batches = plan_batches(headlines, batch_tokens)
+    if not batches:
+        return [], 0
+
+    categories, errors = {}, []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = [executor.submit(_categorize_batch, batch, model) for batch in batches]
+        for future in futures:
+            try:
+                categories.update(future.result())
+            except (requests.RequestException, ValueError) as e:
+                errors.append(e)
+
+    if errors and len(errors) == len(batches):
+        raise CategorizationError(errors[0], len(errors)) from errors[0]
+    categorized = [{"headline": headline, "category": categories[position]}
+                   for position, headline in enumerate(headlines) if position in categories]
+    return categorized, len(errors)
+
+
+def ingest_headlines(categorize=None, urls=None, store=None):
+    """
+    Coleta as manchetes e categoriza apenas as que ainda não estão no store.
+
+    :param categorize: Função que recebe uma lista de manchetes e devolve ([{"headline", "category"}],
+                       número de lotes que falharam) (padrão: categorize_headlines)
+    :param urls: Páginas de listagem (padrão: listing_urls())
+    :param store: HeadlineStore (padrão: get_store())
+    :return: (manchetes categorizadas, dict com as contagens da coleta)
+    """
+    categorize = categorize or categorize_headlines
+    urls = urls or listing_urls()
+    store = store or get_store()
+    headlines, not_modified = fetch_headlines(urls, store)
+
+    known = store.categories(headlines)
+    new = [headline for headline in headlines if headline not in known]
+    failed_batches = 0
+    if new:
+        categorized, failed_batches = categorize(new)
+        categorized = [item for item in categorized if item.get('headline') and item.get('category')]
+        store.save_categories(categorized)
+        known.update({item['headline']: item['category'] for item in categorized})
+
+    result = [{"headline": headline, "category": known[headline]} for headline in headlines if headline in known]
+    stats = {
+        'pages': len(urls),
+        'not_modified': not_modified,
+        'headlines': len(headlines),
+        'new': len(new),
+        'categorized': len(result),
+        'failed_batches': failed_batches,
+    }
+    return result, stats
@@ -0,0 +1,41 @@
+import importlib
+import threading
+import time
+import types
+
+# Importação preguiçosa de módulos pesados.
+# lazy_import devolve um módulo "procurador" que só importa o módulo real no
+# primeiro acesso a um atributo; o tempo de cada importação fica em IMPORT_TIMES,
+# para o relatório de inicialização.
+
+IMPORT_TIMES = {}
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    IMPORT_TIMES[self.__name__] = time.perf_counter() - start
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """Retorna o módulo `name`, importado apenas no primeiro uso."""
+    return LazyModule(name)
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import llm_telemetry
+
+# Cache persistente de respostas do LLM.
+# A chave é o hash de (modelo, mensagens, temperature, top_p, max_tokens); as
+# entradas ficam num SQLite com limite de tamanho e remoção LRU.
+
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join('data', 'cache', 'llm_responses.sqlite'))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+LLM_CACHE_DISABLED = os.getenv('LLM_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes')
+# novas tentativas após erros transitórios (limite de taxa, timeout, 5xx), com espera exponencial
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '1.0'))
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _connect():
+    directory = os.path.dirname(LLM_CACHE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(LLM_CACHE_PATH, timeout=30)
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS responses ('
+        ' key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)'
+    )
+    connection.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+    return connection
+
+
+@contextmanager
+def _transaction():
+    connection = _connect()
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def completion_key(model, messages, temperature, top_p, max_tokens):
+    """Hash sha256 dos parâmetros que determinam a resposta."""
+    payload = json.dumps(
+        {'model': model, 'messages': messages, 'temperature': temperature, 'top_p': top_p, 'max_tokens': max_tokens},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    with _lock, _transaction() as connection:
+        row = connection.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            _stats['misses'] += 1
+            return None
+        connection.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+        _stats['hits'] += 1
+        return row[0]
+
+
+def put(key, response):
+    size = len(response.encode('utf-8'))
+    with _lock, _transaction() as connection:
+        connection.execute(
+            'INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)',
+            (key, response, size, time.time()),
+        )
+        _evict(connection)
+
+
+def _evict(connection):
+    total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+    if total <= LLM_CACHE_MAX_BYTES:
+        return
+    # remove as entradas acessadas há mais tempo até voltar abaixo do limite
+    for key, size in connection.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall():
+        connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+        total -= size
+        if total <= LLM_CACHE_MAX_BYTES:
+            break
+
+
+def stats():
+    """Contadores de acertos/faltas deste processo e ocupação atual do cache."""
+    with _lock, _transaction() as connection:
+        entries, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+    return {**_stats, 'entries': entries, 'bytes': size}
+
+
+def is_transient_error(error):
+    import openai
+    return isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+
+def create_completion(client, call, **kwargs):
+    """
+    client.chat.completions.create com novas tentativas em erros transitórios.
+
+    Os clientes são criados com max_retries=0, para que toda nova tentativa passe por
+    aqui e seja contada na telemetria.
+
+    :param call: CallTimer da telemetria (llm_telemetry.track)
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if attempt == LLM_MAX_RETRIES or not is_transient_error(e):
+                raise
+            call.retry()
+            time.sleep(LLM_RETRY_BACKOFF * 2 ** attempt)
+
+
+def cached_completion(client, model, messages, temperature, top_p, max_tokens, bypass=False, validate=None,
+                      caller='llm'):
+    """
+    Retorna o conteúdo da resposta do chat, consultando o cache antes da rede.
+
+    Com LLM_CACHE_DISABLED o cache não é lido nem gravado.
+
+    :param bypass: Ignora o cache na leitura (a resposta nova ainda é gravada)
+    :param validate: Função opcional; respostas para as quais retorna False não são gravadas
+    :param caller: Nome do chamador na telemetria
+    :return: Texto da resposta
+    """
+    with llm_telemetry.track(caller, model) as call:
+        key = completion_key(model, messages, temperature, top_p, max_tokens)
+        if not (bypass or LLM_CACHE_DISABLED):
+            cached = get(key)
+            if cached is not None:
+                call.cache_hit()
+                return cached
+
+        completion = create_completion(
+            client, call,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens
+        )
+        call.usage_from_response(completion)
+    content = completion.choices[0].message.content
+    if LLM_CACHE_DISABLED or content is None:
+        return content
+    if validate is None or validate(content):
+        put(key, content)
+    return content
+
+
+def cached_completion_stream(client, model, messages, temperature, top_p, max_tokens, bypass=False, caller='llm'):
+    """
+    Versão em streaming de cached_completion: gera os trechos da resposta à medida que chegam.
+
+    Num acerto de cache a resposta inteira é gerada de uma vez. A resposta só é gravada
+    quando o stream é consumido até o fim. Como o stream não informa o uso de tokens,
+    a telemetria registra uma estimativa.
+    """
+    with llm_telemetry.track(caller, model) as call:
+        key = completion_key(model, messages, temperature, top_p, max_tokens)
+        if not (bypass or LLM_CACHE_DISABLED):
+            cached = get(key)
+            if cached is not None:
+                call.cache_hit()
+                call.first_token()
+                yield cached
+                return
+
+        stream = create_completion(
+            client, call,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        parts = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                call.first_token()
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        call.usage(
+            llm_telemetry.estimate_tokens(''.join(message['content'] for message in messages)),
+            llm_telemetry.estimate_tokens(''.join(parts)),
+            estimated=True,
+        )
+
+    if parts and not LLM_CACHE_DISABLED:
+        put(key, ''.join(parts))
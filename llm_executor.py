@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Execução concorrente de chamadas ao LLM.
+# As chamadas rodam num pool de threads, limitadas por requisições e tokens por
+# minuto; os resultados voltam na ordem de entrada, independentemente da ordem
+# em que terminam.
+
+# chamadas simultâneas; o ritmo continua limitado por LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', '4'))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '0'))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', '0'))
+
+
+class _TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Limitador de requisições por minuto e tokens por minuto (token bucket).
+
+    :param requests_per_minute: Máximo de requisições por minuto (0 ou None desativa)
+    :param tokens_per_minute: Máximo de tokens por minuto (0 ou None desativa)
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self._requests = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """Bloqueia até haver capacidade para uma requisição com o custo de tokens informado."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = 0.0
+                if self._requests:
+                    wait = max(wait, self._requests.wait_time(1, now))
+                if self._tokens:
+                    wait = max(wait, self._tokens.wait_time(tokens, now))
+                if wait == 0.0:
+                    if self._requests:
+                        self._requests.take(1)
+                    if self._tokens:
+                        self._tokens.take(tokens)
+                    return
+            time.sleep(wait)
+
+
+def default_rate_limiter():
+    """Limitador configurado pelas variáveis LLM_REQUESTS_PER_MINUTE e LLM_TOKENS_PER_MINUTE."""
+    if not LLM_REQUESTS_PER_MINUTE and not LLM_TOKENS_PER_MINUTE:
+        return None
+    return RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+
+
+def run_ordered(func, items, max_workers=None, rate_limiter=None, cost=None, on_progress=None):
+    """
+    Aplica func a cada item em paralelo e devolve os resultados na ordem de entrada.
+
+    :param func: Função chamada com cada item
+    :param items: Lista de itens
+    :param max_workers: Número de threads (padrão: LLM_MAX_WORKERS)
+    :param rate_limiter: RateLimiter consultado antes de cada chamada (opcional)
+    :param cost: Função que estima os tokens de um item, usada pelo limitador (opcional)
+    :param on_progress: Chamada com a fração concluída, sempre na thread que chamou run_ordered
+    :return: Lista de resultados, alinhada com items
+    """
+    items = list(items)
+    max_workers = max_workers or LLM_MAX_WORKERS
+    results = [None] * len(items)
+
+    def call(item):
+        if rate_limiter is not None:
+            rate_limiter.acquire(cost(item) if cost else 0)
+        return func(item)
+
+    if max_workers <= 1:
+        for i, item in enumerate(items):
+            results[i] = call(item)
+            if on_progress:
+                on_progress((i + 1) / len(items))
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(call, item): i for i, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            # o progresso é reportado aqui (thread principal), pois o Streamlit
+            # não aceita atualizar elementos a partir das threads do pool
+            if on_progress:
+                on_progress(done / len(items))
+    return results
@@ -0,0 +1,269 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Telemetria das chamadas ao LLM.
+# Cada chamada gera um registro (quem chamou, tempo total, tempo até o primeiro token,
+# tokens de prompt e de resposta, tentativas extras, custo estimado). Os registros mais
+# recentes ficam num buffer circular; os totais por chamador são acumulados desde o
+# início do processo e podem ser exportados em JSON lines ou no formato do Prometheus.
+
+TELEMETRY_BUFFER_SIZE = int(os.getenv('TELEMETRY_BUFFER_SIZE', '1000'))
+# se definido, cada registro também é anexado a este arquivo JSON lines
+TELEMETRY_JSONL_PATH = os.getenv('TELEMETRY_JSONL_PATH')
+# preço por 1000 tokens, para a estimativa de custo (0 desativa)
+LLM_PRICE_PER_1K_PROMPT_TOKENS = float(os.getenv('LLM_PRICE_PER_1K_PROMPT_TOKENS', '0'))
+LLM_PRICE_PER_1K_COMPLETION_TOKENS = float(os.getenv('LLM_PRICE_PER_1K_COMPLETION_TOKENS', '0'))
+
+_lock = threading.Lock()
+_records = deque(maxlen=TELEMETRY_BUFFER_SIZE)
+_totals = {}
+# registros a anexar ao TELEMETRY_JSONL_PATH; gravados por uma thread de fundo para que
+# quem faz a chamada (inclusive o event loop do gateway assíncrono) não espere o disco
+_jsonl_queue = queue.SimpleQueue()
+_jsonl_writer = None
+
+# codificação do tiktoken: None antes da primeira tentativa, _ENCODING_UNAVAILABLE se ela falhou
+_ENCODING_UNAVAILABLE = object()
+_encoding_state = None
+_encoding_lock = threading.Lock()
+
+_TOTAL_FIELDS = ('calls', 'errors', 'cached', 'retries', 'wall_time', 'ttft_sum', 'ttft_count',
+                 'prompt_tokens', 'completion_tokens', 'cost')
+
+
+def _encoding():
+    global _encoding_state
+    with _encoding_lock:
+        if _encoding_state is None:
+            try:
+                import tiktoken
+                _encoding_state = tiktoken.get_encoding('cl100k_base')
+            except Exception:
+                # sem o tiktoken ou sem rede para baixar a codificação: a falha também fica
+                # guardada, para não repetir a tentativa (e o timeout) a cada contagem
+                _encoding_state = _ENCODING_UNAVAILABLE
+        return _encoding_state
+
+
+def estimate_tokens(text):
+    """Tokens de um texto (cl100k_base), para respostas em streaming que não informam o uso."""
+    encoding = _encoding()
+    if encoding is _ENCODING_UNAVAILABLE:
+        return None
+    try:
+        return len(encoding.encode_ordinary(text))
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """Tokens de um texto para orçamentos de prompt; sem o tiktoken, ~4 caracteres por token."""
+    tokens = estimate_tokens(text)
+    return tokens if tokens is not None else len(text) // 4 + 1
+
+
+class CallTimer:
+    """Registro de uma chamada em andamento; preenchido por quem faz a chamada."""
+
+    def __init__(self, caller, model):
+        self.record = {
+            'timestamp': time.time(),
+            'caller': caller,
+            'model': model,
+            'status': 'ok',
+            'error': None,
+            'cached': False,
+            'wall_time': None,
+            'ttft': None,
+            'prompt_tokens': None,
+            'completion_tokens': None,
+            'tokens_estimated': False,
+            'retries': 0,
+            'cost': 0.0,
+        }
+        self._start = time.perf_counter()
+
+    def first_token(self):
+        if self.record['ttft'] is None:
+            self.record['ttft'] = time.perf_counter() - self._start
+
+    def retry(self):
+        self.record['retries'] += 1
+
+    def cache_hit(self):
+        self.record['cached'] = True
+
+    def usage(self, prompt_tokens=None, completion_tokens=None, estimated=False):
+        self.record['prompt_tokens'] = prompt_tokens
+        self.record['completion_tokens'] = completion_tokens
+        self.record['tokens_estimated'] = estimated
+
+    def usage_from_response(self, response):
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self.usage(usage.prompt_tokens, usage.completion_tokens)
+
+
+def _accumulate(record):
+    totals = _totals.setdefault(record['caller'], dict.fromkeys(_TOTAL_FIELDS, 0))
+    totals['calls'] += 1
+    totals['errors'] += record['status'] == 'error'
+    totals['cached'] += record['cached']
+    totals['retries'] += record['retries']
+    totals['wall_time'] += record['wall_time']
+    if record['ttft'] is not None:
+        totals['ttft_sum'] += record['ttft']
+        totals['ttft_count'] += 1
+    totals['prompt_tokens'] += record['prompt_tokens'] or 0
+    totals['completion_tokens'] += record['completion_tokens'] or 0
+    totals['cost'] += record['cost']
+
+
+def _write_jsonl(batch):
+    try:
+        with open(TELEMETRY_JSONL_PATH, 'a', encoding='utf-8') as file:
+            file.write(''.join(json.dumps(record) + '\n' for record in batch))
+    except OSError:
+        # a telemetria nunca derruba a aplicação: o lote é descartado
+        pass
+
+
+def _drain_jsonl(batch):
+    try:
+        while True:
+            batch.append(_jsonl_queue.get_nowait())
+    except queue.Empty:
+        return batch
+
+
+def _jsonl_loop():
+    while True:
+        batch = _drain_jsonl([_jsonl_queue.get()])
+        # None na fila: fim do processo (ver flush_jsonl)
+        _write_jsonl([record for record in batch if record is not None])
+        if None in batch:
+            return
+
+
+@atexit.register
+def flush_jsonl():
+    """Encerra a thread de gravação, esperando que os registros da fila cheguem ao arquivo."""
+    global _jsonl_writer
+    with _lock:
+        writer, _jsonl_writer = _jsonl_writer, None
+    if writer is not None:
+        _jsonl_queue.put(None)
+        writer.join()
+
+
+def _enqueue_jsonl(record):
+    global _jsonl_writer
+    if _jsonl_writer is None:
+        _jsonl_writer = threading.Thread(target=_jsonl_loop, name='llm-telemetry-jsonl', daemon=True)
+        _jsonl_writer.start()
+    _jsonl_queue.put(record)
+
+
+def _finish(timer):
+    record = timer.record
+    record['wall_time'] = time.perf_counter() - timer._start
+    if not record['cached']:
+        record['cost'] = (
+            (record['prompt_tokens'] or 0) * LLM_PRICE_PER_1K_PROMPT_TOKENS
+            + (record['completion_tokens'] or 0) * LLM_PRICE_PER_1K_COMPLETION_TOKENS
+        ) / 1000
+    with _lock:
+        _records.append(record)
+        _accumulate(record)
+        if TELEMETRY_JSONL_PATH:
+            _enqueue_jsonl(record)
+
+
+@contextmanager
+def track(caller, model=None):
+    """
+    Mede uma chamada ao LLM; o registro é gravado na saída do bloco (inclusive com erro).
+
+    :param caller: Nome do chamador/pipeline (ex.: 'generate_text')
+    :param model: Modelo usado
+    :return: CallTimer, para marcar o primeiro token, o uso de tokens e as tentativas extras
+    """
+    timer = CallTimer(caller, model)
+    try:
+        yield timer
+    except GeneratorExit:
+        # stream abandonado antes do fim (ex.: o usuário saiu da página)
+        timer.record['status'] = 'cancelled'
+        raise
+    except BaseException as e:
+        timer.record['status'] = 'error'
+        timer.record['error'] = type(e).__name__
+        raise
+    finally:
+        _finish(timer)
+
+
+def records():
+    """Registros mais recentes (até TELEMETRY_BUFFER_SIZE), do mais antigo para o mais novo."""
+    with _lock:
+        return list(_records)
+
+
+def totals():
+    """Totais acumulados por chamador desde o início do processo."""
+    with _lock:
+        return {caller: dict(values) for caller, values in _totals.items()}
+
+
+def clear():
+    with _lock:
+        _records.clear()
+        _totals.clear()
+
+
+def export_jsonl(path=None):
+    """
+    Registros do buffer em JSON lines.
+
+    :param path: Arquivo de destino (opcional)
+    :return: Texto JSON lines
+    """
+    text = ''.join(json.dumps(record) + '\n' for record in records())
+    if path:
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+    return text
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text():
+    """Totais por chamador no formato de exposição de texto do Prometheus."""
+    metrics = [
+        ('llm_calls_total', 'counter', 'Chamadas ao LLM', 'calls'),
+        ('llm_call_errors_total', 'counter', 'Chamadas ao LLM que terminaram em erro', 'errors'),
+        ('llm_cache_hits_total', 'counter', 'Chamadas respondidas pelo cache', 'cached'),
+        ('llm_retries_total', 'counter', 'Tentativas extras após erros transitórios', 'retries'),
+        ('llm_call_seconds_sum', 'counter', 'Tempo total das chamadas (s)', 'wall_time'),
+        ('llm_time_to_first_token_seconds_sum', 'counter', 'Soma dos tempos até o primeiro token (s)', 'ttft_sum'),
+        ('llm_time_to_first_token_seconds_count', 'counter', 'Chamadas com tempo até o primeiro token', 'ttft_count'),
+        ('llm_prompt_tokens_total', 'counter', 'Tokens de prompt', 'prompt_tokens'),
+        ('llm_completion_tokens_total', 'counter', 'Tokens de resposta', 'completion_tokens'),
+        ('llm_cost_total', 'counter', 'Custo estimado', 'cost'),
+    ]
+    current = totals()
+    lines = []
+    for name, kind, description, field in metrics:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for caller, values in sorted(current.items()):
+            lines.append(f'{name}{{caller="{_escape(caller)}"}} {values[field]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,87 @@
+import time
+
+from llm_executor import run_ordered
+
+# Motor de sumarização map-reduce.
+# O estágio map resume os chunks em paralelo; se os resumos parciais não couberem
+# no prompt final, eles são combinados em grupos (tree-reduce) até caberem.
+# Cada estágio registra seu tempo em `timings` (segundos).
+
+
+def group_by_budget(texts, count_tokens, budget):
+    """
+    Agrupa textos consecutivos sem ultrapassar o orçamento de tokens por grupo.
+
+    Todo grupo tem pelo menos dois textos (quando há mais de um), para que cada
+    nível do tree-reduce diminua o número de resumos.
+    """
+    groups = []
+    group, group_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if len(group) >= 2 and group_tokens + tokens > budget:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(text)
+        group_tokens += tokens
+    if group:
+        if len(group) == 1 and groups:
+            groups[-1].append(group[0])
+        else:
+            groups.append(group)
+    return groups
+
+
+def reduce_summaries(summaries, reduce_fn, final_fn, count_tokens, reduce_budget, max_workers=None, timings=None):
+    """
+    Executa o tree-reduce (paralelo, se necessário) e o resumo final sobre resumos parciais.
+
+    :param summaries: Resumos parciais, em ordem
+    :param reduce_fn: Combina uma lista de resumos parciais num resumo intermediário
+    :param final_fn: Combina a lista final de resumos no resultado
+    :param count_tokens: Conta os tokens de um texto
+    :param reduce_budget: Máximo de tokens de resumos enviados a uma chamada de reduce/final
+    :param max_workers: Chamadas simultâneas ao LLM (padrão: LLM_MAX_WORKERS)
+    :param timings: Dict opcional onde o tempo de cada estágio é registrado
+    :return: Resultado de final_fn
+    """
+    if timings is None:
+        timings = {}
+
+    level = summaries
+    depth = 0
+    while len(level) > 1 and sum(count_tokens(text) for text in level) > reduce_budget:
+        depth += 1
+        start = time.perf_counter()
+        groups = group_by_budget(level, count_tokens, reduce_budget)
+        level = run_ordered(reduce_fn, groups, max_workers=max_workers)
+        timings[f'reduce_{depth}'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = final_fn(level)
+    timings['final'] = time.perf_counter() - start
+    return result
+
+
+def map_reduce(chunks, map_fn, reduce_fn, final_fn, count_tokens, reduce_budget, max_workers=None):
+    """
+    Executa map (paralelo) -> tree-reduce (paralelo, se necessário) -> resumo final.
+
+    :param chunks: Lista de entradas do estágio map
+    :param map_fn: Resume um chunk
+    :param reduce_fn: Combina uma lista de resumos parciais num resumo intermediário
+    :param final_fn: Combina a lista final de resumos no resultado
+    :param count_tokens: Conta os tokens de um texto
+    :param reduce_budget: Máximo de tokens de resumos enviados a uma chamada de reduce/final
+    :param max_workers: Chamadas simultâneas ao LLM (padrão: LLM_MAX_WORKERS)
+    :return: (resultado final, resumos do estágio map, timings)
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    summaries = run_ordered(map_fn, chunks, max_workers=max_workers)
+    timings['map'] = time.perf_counter() - start
+
+    result = reduce_summaries(summaries, reduce_fn, final_fn, count_tokens, reduce_budget, max_workers, timings)
+    timings['total'] = sum(timings.values())
+    return result, summaries, timings
@@ -1,11 +1,156 @@
+import os
+import threading
+import time
 import requests
 import streamlit as st
 import json
 
-def ollama_chat():
+from requests.adapters import HTTPAdapter
+
+import llm_telemetry
+
+# Chat com o Ollama via /api/chat, em streaming.
+# Todas as sessões do Streamlit usam a mesma requests.Session (conexões keep-alive),
+# e o keep_alive do Ollama mantém o modelo carregado entre os turnos. O histórico
+# enviado é limitado por OLLAMA_HISTORY_TOKENS, mantendo as mensagens mais recentes.
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_HISTORY_TOKENS = int(os.getenv("OLLAMA_HISTORY_TOKENS", "2048"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "1"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+# lista de modelos (/api/tags): validade do cache e tempo máximo de leitura (s)
+OLLAMA_MODELS_TTL = float(os.getenv("OLLAMA_MODELS_TTL", "60"))
+OLLAMA_MODELS_TIMEOUT = float(os.getenv("OLLAMA_MODELS_TIMEOUT", "2"))
+
+_session = None
+_session_lock = threading.Lock()
+
+_models = {"names": [], "fetched_at": None, "refreshing": False}
+_models_lock = threading.Lock()
+
+
+def get_session():
+    """requests.Session do processo, com pool de conexões keep-alive para o Ollama."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update({"Content-Type": "application/json"})
+            _session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        return _session
+
+
+def _fetch_models():
+    try:
+        response = get_session().get(f"{OLLAMA_BASE_URL}/api/tags",
+                                     timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_MODELS_TIMEOUT))
+        response.raise_for_status()
+        names = [model['name'] for model in response.json().get('models', [])]
+    except (requests.RequestException, ValueError):
+        # Ollama fora do ar: mantém a última lista conhecida até a próxima tentativa
+        names = None
+    with _models_lock:
+        if names is not None:
+            _models["names"] = names
+        _models["fetched_at"] = time.monotonic()
+        _models["refreshing"] = False
+
+
+def get_local_models():
+    """
+    Modelos disponíveis no Ollama, a partir de um cache do processo.
+
+    Só a primeira chamada espera pelo /api/tags (limitada pelos timeouts); depois disso a
+    última lista conhecida é devolvida na hora e, vencido o OLLAMA_MODELS_TTL, atualizada
+    numa thread de fundo.
+
+    :return: Lista com os nomes dos modelos (vazia se o Ollama nunca respondeu)
+    """
+    with _models_lock:
+        fetched_at = _models["fetched_at"]
+        stale = fetched_at is None or time.monotonic() - fetched_at > OLLAMA_MODELS_TTL
+        refresh = stale and not _models["refreshing"]
+        if refresh:
+            _models["refreshing"] = True
+    if refresh:
+        if fetched_at is None:
+            _fetch_models()
+        else:
+            threading.Thread(target=_fetch_models, daemon=True).start()
+    with _models_lock:
+        return list(_models["names"])
+
+
+def trim_history(chat_history, max_tokens=OLLAMA_HISTORY_TOKENS):
+    """
+    Converte o histórico do chat em mensagens do /api/chat, dentro do orçamento de tokens.
+
+    As mensagens mais recentes têm prioridade; a última (a pergunta atual) é sempre enviada.
+
+    :param chat_history: Lista de {"role": ..., "message": ...} (formato de st.session_state.chat_history)
+    :param max_tokens: Máximo de tokens de histórico
+    :return: Lista de {"role": ..., "content": ...}, em ordem cronológica
+    """
+    messages = []
+    used = 0
+    for entry in reversed(chat_history):
+        tokens = llm_telemetry.count_tokens(entry["message"])
+        if messages and used + tokens > max_tokens:
+            break
+        messages.append({"role": entry["role"], "content": entry["message"]})
+        used += tokens
+    messages.reverse()
+    return messages
+
+
+def stream_chat(messages, model=OLLAMA_MODEL, keep_alive=OLLAMA_KEEP_ALIVE):
+    """
+    Envia as mensagens ao /api/chat e gera os trechos da resposta à medida que chegam.
+
+    :raises requests.HTTPError: Se o Ollama responder com erro
+    """
+    data = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        "keep_alive": keep_alive,
+    }
+    with llm_telemetry.track("ollama_chat", model) as call:
+        with get_session().post(f"{OLLAMA_BASE_URL}/api/chat", json=data, stream=True,
+                                timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                content = chunk.get("message", {}).get("content")
+                if content:
+                    call.first_token()
+                    yield content
+                if chunk.get("done"):
+                    call.usage(chunk.get("prompt_eval_count"), chunk.get("eval_count"))
+                    break
+
+
+def ollama_chat(model=None, models=None):
+    """
+    Página de chat com o Ollama.
+
+    :param model: Modelo usado (padrão: OLLAMA_MODEL)
+    :param models: Lista de modelos para o seletor (opcional)
+    """
     st.title("Chat com LLM (Modelo Selecionado)")
     st.write("Interaja com a LLM servida pelo Ollama localmente na porta 11434.")
 
+    if models:
+        model = st.selectbox("Selecione o modelo:", models)
+    model = model or OLLAMA_MODEL
+
     # Sessão para manter o histórico do chat
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
@@ -15,34 +160,21 @@ def ollama_chat():
 
     if st.button("Enviar"):
         if user_input.strip():
-            # Adicionar a entrada do usuário no histórico
-            st.session_state.chat_history.append({"role": "user", "message": user_input})
+            # A pergunta só entra no histórico junto com a resposta: se a chamada falhar,
+            # ela não fica órfã no histórico nem é reenviada com a próxima mensagem
+            user_entry = {"role": "user", "message": user_input}
 
-            # Enviar a mensagem para o Ollama
+            # Enviar o histórico recente para o Ollama e exibir a resposta à medida que chega
             try:
-                url = "http://localhost:11434/api/generate"  # Altere para o endpoint correto
-                headers = {"Content-Type": "application/json"}
-                data = {
-                    "model": "llama3.2",  # Nome do modelo
-                    "prompt": user_input,
-                    "stream": False
-                }
-                
-                with st.spinner("Gerando resposta..."):
-                    response = requests.post(url, headers=headers, json=data)
-                    
-                    if response.status_code == 200:
-                        response_data = response.json()
-                        llm_response = response_data.get('response', 'Sem resposta da LLM.')
-
-                        # Adicionar a resposta no histórico
-                        st.session_state.chat_history.append({"role": "assistant", "message": llm_response})
-                        
-                        # Exibir a resposta
-                        st.markdown(f"**LLM:** {llm_response}")
-                    else:
-                        st.error(f"Erro na requisição: {response.status_code}")
-                        st.error(response.text)
+                messages = trim_history(st.session_state.chat_history + [user_entry])
+                st.markdown("**LLM:**")
+                llm_response = st.write_stream(stream_chat(messages, model))
+
+                # Adicionar a pergunta e a resposta no histórico
+                st.session_state.chat_history.extend([user_entry, {"role": "assistant", "message": llm_response}])
+            except requests.HTTPError as e:
+                st.error(f"Erro na requisição: {e.response.status_code}")
+                st.error(e.response.text)
             except Exception as e:
                 st.error(f"Erro ao se comunicar com o Ollama: {e}")
         else:
@@ -57,4 +189,4 @@ def ollama_chat():
 
 # Adicione esta linha no final do seu script principal
 if __name__ == "__main__":
-    ollama_chat()
\ No newline at end of file
+    ollama_chat()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+import simpsons_data
+
+# Grafo de artefatos do pipeline com memoização ciente de dependências.
+# Cada artefato é registrado com um nome, os artefatos dos quais depende e um
+# "salt" opcional (ex.: assinatura do snapshot, configuração do LLM). A chave de
+# um artefato combina nome, parâmetros, salt e as chaves das dependências, então
+# qualquer mudança a montante invalida tudo o que vem depois. Os valores ficam em
+# memória (reruns e sessões deste processo) e em disco (processos anteriores).
+# Cada chave tem um lock: sessões que pedem o mesmo artefato ao mesmo tempo
+# esperam o primeiro cálculo em vez de repeti-lo.
+
+ARTIFACTS_DIR = os.getenv('ARTIFACTS_DIR', os.path.join(simpsons_data.CACHE_DIR, 'artifacts'))
+
+_registry = {}
+_memory = {}
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def artifact(name, deps=(), salt=None, valid=None):
+    """
+    Registra a função decorada como produtora do artefato `name`.
+
+    A função recebe os parâmetros do artefato e, como argumentos nomeados, os
+    valores das dependências.
+
+    :param deps: Nomes dos artefatos dos quais este depende
+    :param salt: Valor (ou função sem argumentos) que também entra na chave
+    :param valid: Função opcional; valores para os quais retorna False não são memoizados
+    """
+    def register(fn):
+        _registry[name] = {'fn': fn, 'deps': tuple(deps), 'salt': salt, 'valid': valid}
+        return fn
+    return register
+
+
+def artifact_key(name, **params):
+    spec = _registry[name]
+    salt = spec['salt']() if callable(spec['salt']) else spec['salt']
+    material = {
+        'name': name,
+        'params': params,
+        'salt': salt,
+        'deps': [artifact_key(dep, **params) for dep in spec['deps']],
+    }
+    payload = json.dumps(material, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _artifact_path(name, key):
+    return os.path.join(ARTIFACTS_DIR, f"{name}-{key[:32]}.pkl")
+
+
+def _key_lock(key):
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _load(name, key):
+    try:
+        with open(_artifact_path(name, key), 'rb') as file:
+            return True, pickle.load(file)
+    except Exception:
+        # arquivo ausente, truncado ou de uma versão antiga do código (classe/módulo
+        # renomeado): tratado como ausente, e o artefato é recalculado
+        return False, None
+
+
+def _save(name, key, value):
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(value, file)
+    simpsons_data.atomic_write(_artifact_path(name, key), write)
+
+
+def get(name, **params):
+    """
+    Retorna o artefato, calculando (com suas dependências) apenas o que ainda não existe.
+
+    :param name: Nome do artefato registrado
+    :param params: Parâmetros do pipeline (ex.: episode_id, season)
+    """
+    key = artifact_key(name, **params)
+    if key in _memory:
+        return _memory[key]
+
+    with _key_lock(key):
+        # outra sessão pode ter calculado o artefato enquanto esta esperava o lock
+        if key in _memory:
+            return _memory[key]
+
+        found, value = _load(name, key)
+        if found:
+            _memory[key] = value
+            return value
+
+        spec = _registry[name]
+        inputs = {dep: get(dep, **params) for dep in spec['deps']}
+        value = spec['fn'](**params, **inputs)
+
+        if spec['valid'] is None or spec['valid'](value):
+            _memory[key] = value
+            _save(name, key, value)
+        return value
+
+
+def put(name, value, **params):
+    """
+    Registra um valor calculado fora de get() (ex.: um texto recebido em streaming).
+
+    :return: True se o valor foi memoizado (respeitando o critério `valid` do artefato)
+    """
+    spec = _registry[name]
+    if spec['valid'] is not None and not spec['valid'](value):
+        return False
+    key = artifact_key(name, **params)
+    _memory[key] = value
+    _save(name, key, value)
+    return True
+
+
+def is_computed(name, **params):
+    """Indica se o artefato já está disponível (em memória ou em disco) sem calculá-lo."""
+    key = artifact_key(name, **params)
+    return key in _memory or os.path.exists(_artifact_path(name, key))
@@ -0,0 +1,171 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import simpsons_data
+
+# Classificação de sentimentos do corpus inteiro (ou de um intervalo de temporadas), fora do Streamlit.
+#
+# Os episódios são divididos entre processos. Cada lote classificado é gravado no
+# checkpoint do episódio assim que termina, e cada episódio concluído vira um
+# arquivo Parquet; uma execução interrompida retoma de onde parou sem repetir
+# chamadas ao LLM. No final, os episódios são consolidados num único arquivo.
+#
+# Uso: python sentiment_batch.py --first-season 1 --last-season 5 --processes 4 --output sentimentos.parquet
+
+SENTIMENT_BATCH_DIR = os.getenv('SENTIMENT_BATCH_DIR', os.path.join(simpsons_data.CACHE_DIR, 'sentiment_batch'))
+
+
+def _episode_paths(checkpoint_dir, season, episode_id):
+    name = f"s{season:02d}_e{episode_id:03d}"
+    return os.path.join(checkpoint_dir, name + '.jsonl'), os.path.join(checkpoint_dir, name + '.parquet')
+
+
+def _process_rate_limiter(processes):
+    # os limites de requisições/tokens por minuto valem para o job todo: cada processo fica com uma fração
+    from llm_executor import LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, RateLimiter
+    if not LLM_REQUESTS_PER_MINUTE and not LLM_TOKENS_PER_MINUTE:
+        return None
+    return RateLimiter(LLM_REQUESTS_PER_MINUTE / processes, LLM_TOKENS_PER_MINUTE / processes)
+
+
+def _stage_counts(classified):
+    if 'sentiment_stage' not in classified:
+        return {}
+    return classified['sentiment_stage'].value_counts().to_dict()
+
+
+def classify_episode(season, episode_id, checkpoint_dir, processes=1, max_workers=None, cascade=None, threshold=None):
+    """
+    Classifica um episódio e grava o resultado no diretório de checkpoints.
+
+    :return: (season, episode_id, falas classificadas, chamadas ao LLM feitas, falas por estágio)
+    """
+    # importado no processo filho: o módulo lê a configuração do LLM no import
+    from simpsons_sentiment_analysis import analyze_simpsons_sentiments
+
+    checkpoint_path, result_path = _episode_paths(checkpoint_dir, season, episode_id)
+    if os.path.exists(result_path):
+        classified = pd.read_parquet(result_path)
+        return season, episode_id, len(classified), 0, _stage_counts(classified)
+
+    classified, _, _, _, num_calls = analyze_simpsons_sentiments(
+        max_workers=max_workers,
+        rate_limiter=_process_rate_limiter(processes),
+        season=season,
+        episode_id=episode_id,
+        checkpoint_path=checkpoint_path,
+        cascade=cascade,
+        threshold=threshold,
+    )
+    if classified['spoken_words'].notna().any() and classified.loc[classified['spoken_words'].notna(), 'sentiment'].isna().any():
+        # há falas sem rótulo (lote que falhou): o episódio fica só no checkpoint e é refeito na próxima execução
+        return season, episode_id, len(classified), num_calls, _stage_counts(classified)
+
+    tmp_path = result_path + '.tmp'
+    classified.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, result_path)
+    return season, episode_id, len(classified), num_calls, _stage_counts(classified)
+
+
+def consolidate(episodes, checkpoint_dir, output):
+    """
+    Junta os resultados dos episódios concluídos num único arquivo (.parquet ou .csv).
+
+    :return: Número de episódios que ainda não foram concluídos
+    """
+    frames, missing = [], 0
+    for season, episode_id in episodes:
+        _, result_path = _episode_paths(checkpoint_dir, season, episode_id)
+        if os.path.exists(result_path):
+            frames.append(pd.read_parquet(result_path))
+        else:
+            missing += 1
+    if frames:
+        combined = pd.concat(frames, ignore_index=True)
+        if output.endswith('.csv'):
+            combined.to_csv(output, index=False)
+        else:
+            combined.to_parquet(output, index=False)
+    return missing
+
+
+def run_batch(first_season=None, last_season=None, processes=1, max_workers=None,
+              checkpoint_dir=SENTIMENT_BATCH_DIR, output='simpsons_sentiments.parquet', cascade=None, threshold=None):
+    """
+    Classifica todos os episódios do intervalo de temporadas e consolida o resultado.
+
+    :param first_season: Primeira temporada (None: desde a primeira)
+    :param last_season: Última temporada (None: até a última)
+    :param processes: Processos entre os quais os episódios são divididos
+    :param max_workers: Chamadas simultâneas ao LLM em cada processo (padrão: LLM_MAX_WORKERS)
+    :param checkpoint_dir: Diretório dos checkpoints por episódio
+    :param output: Arquivo consolidado (.parquet ou .csv)
+    :param cascade: Pré-classifica com o léxico do VADER (padrão: SENTIMENT_CASCADE)
+    :param threshold: Confiança mínima do léxico (padrão: SENTIMENT_CASCADE_THRESHOLD)
+    :return: dict com falas, chamadas, falas por estágio, tempo e taxas por segundo
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    episodes = simpsons_data.list_episodes(first_season, last_season)
+
+    start = time.perf_counter()
+    lines, calls, stages = 0, 0, {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(classify_episode, season, episode_id, checkpoint_dir, processes, max_workers,
+                            cascade, threshold)
+            for season, episode_id in episodes
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            season, episode_id, episode_lines, episode_calls, episode_stages = future.result()
+            lines += episode_lines
+            calls += episode_calls
+            for stage, count in episode_stages.items():
+                stages[stage] = stages.get(stage, 0) + count
+            print(f"[{done}/{len(episodes)}] temporada {season}, episódio {episode_id}: "
+                  f"{episode_lines} falas, {episode_calls} chamadas")
+    elapsed = time.perf_counter() - start
+
+    missing = consolidate(episodes, checkpoint_dir, output)
+    return {
+        'episodes': len(episodes),
+        'incomplete': missing,
+        'lines': lines,
+        'calls': calls,
+        'stages': stages,
+        'seconds': elapsed,
+        'lines_per_second': lines / elapsed if elapsed else 0.0,
+        'calls_per_second': calls / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classificação de sentimentos do corpus de The Simpsons em lote.")
+    parser.add_argument('--first-season', type=int, default=None, help="Primeira temporada (padrão: todas)")
+    parser.add_argument('--last-season', type=int, default=None, help="Última temporada (padrão: todas)")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="Processos de trabalho")
+    parser.add_argument('--max-workers', type=int, default=None, help="Chamadas simultâneas por processo")
+    parser.add_argument('--checkpoint-dir', default=SENTIMENT_BATCH_DIR, help="Diretório de checkpoints")
+    parser.add_argument('--cascade', action='store_true', default=None,
+                        help="Pré-classifica com o léxico do VADER e envia ao LLM só as falas de baixa confiança")
+    parser.add_argument('--cascade-threshold', type=float, default=None, help="Confiança mínima do léxico")
+    parser.add_argument('--output', default='simpsons_sentiments.parquet', help="Arquivo consolidado (.parquet ou .csv)")
+    args = parser.parse_args()
+
+    report = run_batch(args.first_season, args.last_season, args.processes, args.max_workers,
+                       args.checkpoint_dir, args.output, args.cascade, args.cascade_threshold)
+    print(f"Episódios: {report['episodes']} ({report['incomplete']} incompletos)")
+    print(f"Falas: {report['lines']} | Chamadas ao LLM: {report['calls']} | Tempo: {report['seconds']:.1f} s")
+    if report['stages']:
+        print("Falas por estágio: " + ", ".join(f"{stage}: {count}" for stage, count in report['stages'].items()))
+    print(f"{report['lines_per_second']:.1f} falas/s | {report['calls_per_second']:.2f} chamadas/s")
+    if report['incomplete']:
+        print("Há episódios incompletos: execute novamente para retomar a partir dos checkpoints.")
+    print(f"Resultado consolidado em {args.output}")
+
+
+if __name__ == '__main__':
+    main()
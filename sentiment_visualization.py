@@ -1,6 +1,7 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
 
 @st.cache_data
 def read_csv(file):
@@ -15,6 +16,8 @@ def process_data(df, episode=None):
 
 def create_pie_chart(data, episode=None):
     """Cria um gráfico de pizza com os dados processados."""
+    import plotly.express as px  # importado só quando há gráfico a desenhar
+    
     title = f"Proporção de Falas por Categoria de Sentimento"
     if episode:
         title += f" (Episódio {episode})"
@@ -0,0 +1,143 @@
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+import simpsons_data
+import simpsons_tokens
+
+# Dataset compartilhado por todas as sessões do servidor Streamlit.
+# O snapshot (com a coluna de tokens e o índice de episódios) é carregado uma
+# única vez por processo, atrás de st.cache_resource. As sessões recebem
+# DataFrames com colunas Arrow (pd.ArrowDtype) que apontam para os mesmos
+# buffers da tabela compartilhada: nada é copiado e escritas numa sessão criam
+# colunas novas, sem alterar os buffers vistos pelas outras.
+# No modo lean (SIMPSONS_LOAD_MODE), a tabela tem só as colunas usadas pelo app;
+# as demais colunas do snapshot são lidas à parte quando pedidas (e reaproveitadas
+# pelo cache de tabelas de simpsons_data).
+
+
+class SharedDataset:
+    """
+    :param table: Tabela compartilhada (todas as colunas do snapshot ou, no modo lean, a projeção do app)
+    :param episode_index: Índice de episódios do manifesto
+    :param columns: Todas as colunas disponíveis (as do snapshot e a de tokens)
+    """
+
+    def __init__(self, table, episode_index, columns=None):
+        self.table = table
+        self.episode_index = episode_index
+        self.columns = list(columns) if columns is not None else table.column_names
+
+    def _select(self, columns):
+        # None pede todas as colunas, como simpsons_data.load_simpsons_data
+        columns = self.columns if columns is None else list(columns)
+        unknown = [name for name in columns if name not in self.columns]
+        if unknown:
+            raise KeyError(f"Colunas inexistentes no snapshot: {unknown}")
+        missing = [name for name in columns if name not in self.table.column_names]
+        table = self.table
+        if missing:
+            # fora da projeção do modo lean: lidas do snapshot, alinhadas linha a linha com a tabela
+            extra, _ = simpsons_data._load_table(missing, lean=True)
+            for name in missing:
+                table = table.append_column(name, extra.column(name))
+        return table.select(columns)
+
+    def frame(self, columns=None):
+        """DataFrame (Arrow, sem cópia) com as colunas pedidas de todo o corpus."""
+        return simpsons_data.to_frame(self._select(columns), lean=True)
+
+    def episode_lines(self, season, episode_id, columns=None):
+        """Falas de um episódio, como fatia da tabela compartilhada (sem cópia)."""
+        start, stop = self.episode_index.get(simpsons_data._index_key(season, episode_id), (0, 0))
+        episode_lines = simpsons_data.to_frame(self._select(columns).slice(start, stop - start), lean=True)
+        episode_lines.index = pd.RangeIndex(start, stop)
+        return episode_lines
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_shared_dataset(signature):
+    # a assinatura do snapshot faz parte da chave: se os CSVs mudarem, o dataset é recarregado
+    if simpsons_data.SIMPSONS_LOAD_MODE == 'lean':
+        # só as colunas usadas pelo app, com tipos compactos
+        table, manifest = simpsons_data._load_table(simpsons_data.columns_for('app'), lean=True)
+    else:
+        table, manifest = simpsons_data._load_table()
+    tokens = simpsons_data.downcast(pa.chunked_array([simpsons_tokens.load_token_counts().to_numpy()]))
+    table = table.append_column('tokens', tokens)
+    columns = pq.read_schema(simpsons_data.SNAPSHOT_PATH).names + ['tokens']
+    return SharedDataset(table, manifest['episode_index'], columns)
+
+
+def get_shared_dataset():
+    """Dataset do processo (merge + tokens + índice de episódios), carregado uma única vez."""
+    return _load_shared_dataset(simpsons_data.snapshot_signature())
+
+
+def get_episode_lines(season, episode_id, columns=None):
+    return get_shared_dataset().episode_lines(season, episode_id, columns)
+
+
+def load_simpsons_data(columns=None):
+    return get_shared_dataset().frame(columns)
+
+
+def _current_rss_bytes():
+    try:
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # fora do Linux, usa o pico de RSS (ru_maxrss é em bytes no macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _object_bytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    return sys.getsizeof(value)
+
+
+def memory_report(session_state=None):
+    """
+    Uso de memória do processo, do dataset compartilhado e desta sessão.
+
+    :param session_state: st.session_state (ou dict) da sessão atual, para estimar seu custo
+    :return: dict com os valores em bytes
+    """
+    report = {
+        'process_rss': _current_rss_bytes(),
+        'arrow_allocated': pa.total_allocated_bytes(),
+        'shared_dataset': get_shared_dataset().nbytes,
+    }
+    if session_state is not None:
+        # colunas Arrow derivadas do dataset compartilhado contam aqui pelo tamanho
+        # lógico, então esta é uma estimativa pessimista do custo da sessão
+        report['session_state'] = sum(_object_bytes(session_state[key]) for key in list(session_state.keys()))
+    return report
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+
+if __name__ == '__main__':
+    for name, size in memory_report().items():
+        print(f"{name:<20} {format_bytes(size):>12}")
+    print(f"{'pid':<20} {os.getpid():>12}")
@@ -1,13 +1,26 @@
-import pandas as pd
-import tiktoken
 import streamlit as st
-import matplotlib.pyplot as plt
+import hashlib
+import logging
 import os
+import time
+from collections import deque
 from dotenv import load_dotenv
 
 
-from openai import OpenAI
-from summary_metrics import compare_summaries, analyze_convergence
+import simpsons_data
+import simpsons_tokens
+import shared_dataset
+from llm_cache import cached_completion, cached_completion_stream, create_completion
+import llm_telemetry
+from llm_executor import run_ordered
+from map_reduce import map_reduce, reduce_summaries
+import pipeline_artifacts
+from pipeline_artifacts import artifact
+from lazy_imports import lazy_import
+
+# importados só quando usados (gráficos e métricas não são necessários para gerar resumos)
+plt = lazy_import('matplotlib.pyplot')
+summary_metrics = lazy_import('summary_metrics')
 
 # Carrega as variáveis de ambiente
 load_dotenv(override=True)
@@ -26,55 +39,148 @@ OPENAI_MODEL = get_env('OPENAI_MODEL', required=True)
 TEMPERATURE = float(get_env('TEMPERATURE', '0.5'))
 TOP_P = float(get_env('TOP_P', '1.0'))
 MAX_TOKENS = int(get_env('MAX_TOKENS', '1024'))
+# Máximo de tokens de resumos parciais no prompt final antes de recorrer ao tree-reduce
+SUMMARY_REDUCE_BUDGET = int(get_env('SUMMARY_REDUCE_BUDGET', '3000'))
+# Idioma para o qual os resumos são traduzidos antes das métricas (vazio: avalia no original)
+SUMMARY_METRICS_LANG = get_env('SUMMARY_METRICS_LANG', '')
+
+GENERATION_ERROR = "Erro ao gerar análise."
+
+# Prompts do pipeline de resumo. Os textos entram (por hash) no salt dos artefatos que os
+# usam: editar um prompt invalida os resumos persistidos que dependem dele.
+EPISODE_SUMMARY_PROMPT = """
+    Leia as seguintes falas do episódio número {episode_id} da temporada {season} de The Simpsons e faça um resumo de aproximadamente 500 tokens, explicando o que acontece e como termina o episódio:
+
+    {episode_text}
 
-# Inicialização do cliente OpenAI
-client = OpenAI(
-    base_url=OPENAI_BASE_URL,
-    api_key=OPENAI_API_KEY
-)
+    Resumo (aproximadamente 500 tokens):
+    """
+
+CHUNK_SUMMARY_PROMPT = """
+    Resuma o seguinte trecho de diálogo do episódio dos Simpsons em aproximadamente 100 palavras:
+
+    {chunk}
 
-def load_simpsons_data():
-    episodes = pd.read_csv('data/simpsons_episodes.csv', dtype={'id': 'int32', 'season': 'int32'})
-    script_lines = pd.read_csv('data/simpsons_script_lines.csv', low_memory=False, dtype={'episode_id': 'int32'})
-    combined_data = pd.merge(episodes, script_lines, left_on='id', right_on='episode_id')
-    return combined_data
+    Resumo:
+    """
+
+COMBINE_SUMMARIES_PROMPT = """
+    Combine os seguintes resumos de partes consecutivas de um episódio dos Simpsons em um único resumo de aproximadamente 200 palavras, mantendo a ordem dos acontecimentos:
+
+    {summaries}
+
+    Resumo combinado:
+    """
+
+FINAL_SUMMARY_PROMPT = """
+    Com base nos seguintes resumos de partes do episódio {episode_id} da temporada {season} dos Simpsons, crie um resumo final coerente de aproximadamente 500 palavras:
+
+    {summaries}
+
+    Resumo final:
+    """
+
+EVALUATION_PROMPT = """
+    Avalie o seguinte resumo do episódio {episode_id} da temporada {season} dos Simpsons quanto à veracidade e coerência:
+
+    {final_summary}
+
+    Forneça uma análise detalhada sobre a qualidade do resumo, sua fidelidade ao conteúdo original e sua coerência narrativa.
+    """
+
+CHUNK_EVALUATION_PROMPT = """
+        Avalie o seguinte resumo de uma parte do episódio {episode_id} da temporada {season} dos Simpsons quanto à veracidade e coerência:
+
+        {chunk_summary}
+
+        Forneça uma breve análise sobre a qualidade deste resumo parcial.
+        """
+
+# Tempo até o primeiro token e tempo total das últimas chamadas em streaming
+STREAM_STATS = deque(maxlen=200)
+
+# Cliente OpenAI, criado no primeiro uso
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(
+            base_url=OPENAI_BASE_URL,
+            api_key=OPENAI_API_KEY,
+            # as novas tentativas ficam em llm_cache.create_completion, que as registra na telemetria
+            max_retries=0
+        )
+    return _client
+
+def load_simpsons_data(columns=None):
+    return shared_dataset.load_simpsons_data(columns=columns)
 
 def count_tokens(text):
-    encoding = tiktoken.get_encoding("cl100k_base")
-    if pd.isna(text):
-        return 0
-    return len(encoding.encode(str(text)))
+    return simpsons_tokens.count_tokens(text)
 
-def generate_text(prompt):
+def generate_text(prompt, bypass_cache=False):
     try:
-        completion = client.chat.completions.create(
+        return cached_completion(
+            get_client(),
             model=OPENAI_MODEL,
             messages=[{"role": "user", "content": prompt}],
             temperature=TEMPERATURE,
             top_p=TOP_P,
-            max_tokens=MAX_TOKENS
+            max_tokens=MAX_TOKENS,
+            bypass=bypass_cache,
+            caller='generate_text'
         )
-        return completion.choices[0].message.content
     except Exception as e:
         print(f"Error generating text: {str(e)}")
-        return "Erro ao gerar análise."
+        return GENERATION_ERROR
+
+def generate_text_stream(prompt, bypass_cache=False):
+    """
+    Gera o texto em streaming, produzindo os trechos à medida que chegam.
+
+    O tempo até o primeiro token (ttft) e o tempo total de cada chamada ficam em STREAM_STATS.
+    """
+    start = time.perf_counter()
+    stats = {'ttft': None, 'total': None}
+    try:
+        for delta in cached_completion_stream(
+            get_client(),
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+            top_p=TOP_P,
+            max_tokens=MAX_TOKENS,
+            bypass=bypass_cache,
+            caller='generate_text_stream'
+        ):
+            if stats['ttft'] is None:
+                stats['ttft'] = time.perf_counter() - start
+            yield delta
+    except Exception as e:
+        print(f"Error generating text: {str(e)}")
+        yield GENERATION_ERROR
+    finally:
+        stats['total'] = time.perf_counter() - start
+        STREAM_STATS.append(stats)
 
 def analyze_simpsons_data():
     st.header("Análise dos Episódios de The Simpsons")
     
-    data = load_simpsons_data()
+    data = load_simpsons_data(columns=['imdb_rating', 'us_viewers_in_millions'])
+    episode_stats, season_stats = simpsons_tokens.load_token_stats()
     
     with st.expander("Análise de Tokens"):
         st.subheader("Análise de Tokens")
-        data['tokens'] = data['spoken_words'].apply(count_tokens)
         
         # por episódio
-        avg_tokens_per_episode = data.groupby('episode_id')['tokens'].sum().mean()
-        max_tokens_episode = data.groupby('episode_id')['tokens'].sum().idxmax()
-        max_tokens_episode_count = data.groupby('episode_id')['tokens'].sum().max()
+        avg_tokens_per_episode = episode_stats['tokens_sum'].mean()
+        max_tokens_episode = episode_stats['tokens_sum'].idxmax()
+        max_tokens_episode_count = episode_stats['tokens_sum'].max()
         
         # por temporada
-        season_data = data.groupby('season')['tokens'].sum()
+        season_data = season_stats['tokens_sum']
         avg_tokens_per_season = season_data.mean()
         max_tokens_season = season_data.idxmax()
         max_tokens_season_count = season_data.max()
@@ -131,23 +237,22 @@ def analyze_simpsons_data():
 
         
 
-def summarize_episode(episode_id, season):
-    data = load_simpsons_data()
-    episode_data = data[(data['episode_id'] == episode_id) & (data['season'] == season)]
+def episode_summary_prompt(episode_id, season):
+    episode_data = shared_dataset.get_episode_lines(season, episode_id, columns=['spoken_words'])
     
     if episode_data.empty:
-        return "Episódio não encontrado.", 0
+        return None
     
     episode_lines = episode_data['spoken_words'].dropna().tolist()
     episode_text = " ".join(episode_lines)
     
-    prompt = f"""
-    Leia as seguintes falas do episódio número {episode_id} da temporada {season} de The Simpsons e faça um resumo de aproximadamente 500 tokens, explicando o que acontece e como termina o episódio:
+    return EPISODE_SUMMARY_PROMPT.format(episode_id=episode_id, season=season, episode_text=episode_text)
 
-    {episode_text}
-
-    Resumo (aproximadamente 500 tokens):
-    """
+def summarize_episode(episode_id, season):
+    prompt = episode_summary_prompt(episode_id, season)
+    
+    if prompt is None:
+        return "Episódio não encontrado.", 0
     
     summary = generate_text(prompt)
     
@@ -167,13 +272,16 @@ def test_api_connection():
         print(f"Using model: {OPENAI_MODEL}")
         print(f"API Key (primeiros 5 caracteres): {OPENAI_API_KEY[:5]}...")
         
-        completion = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": "Hello"}],
-            temperature=TEMPERATURE,
-            top_p=TOP_P,
-            max_tokens=MAX_TOKENS
-        )
+        with llm_telemetry.track('test_api_connection', OPENAI_MODEL) as call:
+            completion = create_completion(
+                get_client(), call,
+                model=OPENAI_MODEL,
+                messages=[{"role": "user", "content": "Hello"}],
+                temperature=TEMPERATURE,
+                top_p=TOP_P,
+                max_tokens=MAX_TOKENS
+            )
+            call.usage_from_response(completion)
         
         print("API connection successful!")
         print(f"Response: {completion.choices[0].message.content}")
@@ -192,62 +300,160 @@ def create_chunks(lines, chunk_size=100, overlap=25):
     return chunks
 
 def summarize_chunk(chunk):
-    prompt = f"""
-    Resuma o seguinte trecho de diálogo do episódio dos Simpsons em aproximadamente 100 palavras:
+    return generate_text(CHUNK_SUMMARY_PROMPT.format(chunk=' '.join(chunk)))
 
-    {' '.join(chunk)}
+def combine_summaries(summaries):
+    return generate_text(COMBINE_SUMMARIES_PROMPT.format(summaries=' '.join(summaries)))
 
-    Resumo:
+def final_summary_prompt(episode_id, season, summaries):
+    return FINAL_SUMMARY_PROMPT.format(episode_id=episode_id, season=season, summaries=' '.join(summaries))
+
+def summarize_episode_chunks(episode_id, season, max_workers=None, with_timings=False):
     """
-    return generate_text(prompt)
+    Resume o episódio em map-reduce: chunks resumidos em paralelo e um resumo final.
 
-def summarize_episode_chunks(episode_id, season):
-    data = load_simpsons_data()
-    episode_lines = data[(data['episode_id'] == episode_id) & (data['season'] == season)]['spoken_words'].dropna().tolist()
+    :param max_workers: Chamadas simultâneas ao LLM (padrão: LLM_MAX_WORKERS)
+    :param with_timings: Inclui no retorno um dict com o tempo (s) de cada estágio
+    :return: (resumo final, número de chunks, resumos dos chunks[, timings])
+    """
+    episode_lines = shared_dataset.get_episode_lines(season, episode_id, columns=['spoken_words'])['spoken_words'].dropna().tolist()
     
     chunks = create_chunks(episode_lines)
-    chunk_summaries = [summarize_chunk(chunk) for chunk in chunks]
     
-    final_prompt = f"""
-    Com base nos seguintes resumos de partes do episódio {episode_id} da temporada {season} dos Simpsons, crie um resumo final coerente de aproximadamente 500 palavras:
-
-    {' '.join(chunk_summaries)}
-
-    Resumo final:
-    """
+    final_summary, chunk_summaries, timings = map_reduce(
+        chunks,
+        map_fn=summarize_chunk,
+        reduce_fn=combine_summaries,
+        final_fn=lambda summaries: generate_text(final_summary_prompt(episode_id, season, summaries)),
+        count_tokens=count_tokens,
+        reduce_budget=SUMMARY_REDUCE_BUDGET,
+        max_workers=max_workers,
+    )
     
-    final_summary = generate_text(final_prompt)
+    logging.info("Tempos do resumo por chunks (s): " + ", ".join(f"{stage}={seconds:.2f}" for stage, seconds in timings.items()))
     
+    if with_timings:
+        return final_summary, len(chunks), chunk_summaries, timings
     return final_summary, len(chunks), chunk_summaries
 
-def analyze_episode_summary(episode_id, season):
-    final_summary, num_chunks, chunk_summaries = summarize_episode_chunks(episode_id, season)
-    
-    evaluation_prompt = f"""
-    Avalie o seguinte resumo do episódio {episode_id} da temporada {season} dos Simpsons quanto à veracidade e coerência:
-
-    {final_summary}
 
-    Forneça uma análise detalhada sobre a qualidade do resumo, sua fidelidade ao conteúdo original e sua coerência narrativa.
+# Artefatos do pipeline de resumo detalhado:
+# chunks -> chunk_summaries -> final_summary -> evaluation
+#                           -> chunk_evaluations
+# reference_summary, final_summary, chunk_summaries -> metrics
+
+def _llm_salt():
+    return [OPENAI_MODEL, TEMPERATURE, TOP_P, MAX_TOKENS]
+
+def _prompt_salt(*prompts):
+    """Salt de um artefato gerado pelo LLM: configuração do modelo e hash dos prompts usados."""
+    digest = hashlib.sha256('\0'.join(prompts).encode('utf-8')).hexdigest()
+    return lambda: [*_llm_salt(), digest]
+
+def _generated_ok(value):
+    # respostas de erro não são memoizadas, para que a próxima execução tente de novo
+    values = value if isinstance(value, list) else [value]
+    return all(GENERATION_ERROR not in str(item) for item in values)
+
+@artifact('chunks', salt=simpsons_data.snapshot_signature)
+def _chunks_artifact(episode_id, season):
+    episode_lines = shared_dataset.get_episode_lines(season, episode_id, columns=['spoken_words'])['spoken_words'].dropna().tolist()
+    return create_chunks(episode_lines)
+
+@artifact('chunk_summaries', deps=['chunks'], salt=_prompt_salt(CHUNK_SUMMARY_PROMPT), valid=_generated_ok)
+def _chunk_summaries_artifact(episode_id, season, chunks):
+    return run_ordered(summarize_chunk, chunks)
+
+@artifact('final_summary', deps=['chunk_summaries'], salt=_prompt_salt(COMBINE_SUMMARIES_PROMPT, FINAL_SUMMARY_PROMPT), valid=_generated_ok)
+def _final_summary_artifact(episode_id, season, chunk_summaries):
+    return reduce_summaries(
+        chunk_summaries,
+        reduce_fn=combine_summaries,
+        final_fn=lambda summaries: generate_text(final_summary_prompt(episode_id, season, summaries)),
+        count_tokens=count_tokens,
+        reduce_budget=SUMMARY_REDUCE_BUDGET,
+    )
+
+@artifact('evaluation', deps=['final_summary'], salt=_prompt_salt(EVALUATION_PROMPT), valid=_generated_ok)
+def _evaluation_artifact(episode_id, season, final_summary):
+    return generate_text(EVALUATION_PROMPT.format(episode_id=episode_id, season=season, final_summary=final_summary))
+
+@artifact('chunk_evaluations', deps=['chunk_summaries'], salt=_prompt_salt(CHUNK_EVALUATION_PROMPT), valid=_generated_ok)
+def _chunk_evaluations_artifact(episode_id, season, chunk_summaries):
+    def evaluate(chunk_summary):
+        return generate_text(CHUNK_EVALUATION_PROMPT.format(
+            episode_id=episode_id, season=season, chunk_summary=chunk_summary
+        ))
+    return run_ordered(evaluate, chunk_summaries)
+
+_reference_summary_salt = _prompt_salt(EPISODE_SUMMARY_PROMPT)
+
+@artifact('reference_summary', salt=lambda: [simpsons_data.snapshot_signature(), *_reference_summary_salt()], valid=_generated_ok)
+def _reference_summary_artifact(episode_id, season):
+    return analyze_episode(episode_id, season)[0]  # Assumindo que esta função retorna o resumo simples
+
+@artifact('metrics', deps=['reference_summary', 'final_summary', 'chunk_summaries'], salt=lambda: [summary_metrics.METRICS_VERSION, SUMMARY_METRICS_LANG])
+def _metrics_artifact(episode_id, season, reference_summary, final_summary, chunk_summaries):
+    final_metrics, chunk_metrics = summary_metrics.compare_summaries(
+        reference_summary, final_summary, chunk_summaries, target_lang=SUMMARY_METRICS_LANG or None
+    )
+    convergence_analysis, omitted_info = summary_metrics.analyze_convergence(
+        reference_summary, final_summary, chunk_summaries, metrics=(final_metrics, chunk_metrics)
+    )
+    return final_metrics, chunk_metrics, convergence_analysis, omitted_info
+
+def get_artifact(name, episode_id, season):
+    """Retorna um artefato do pipeline de resumo, reaproveitando o que já foi calculado."""
+    return pipeline_artifacts.get(name, episode_id=episode_id, season=season)
+
+def _stream_artifact(name, episode_id, season, deltas):
+    # repassa os trechos ao chamador e memoiza o texto completo ao final
+    parts = []
+    for delta in deltas:
+        parts.append(delta)
+        yield delta
+    pipeline_artifacts.put(name, ''.join(parts), episode_id=episode_id, season=season)
+
+def stream_reference_summary(episode_id, season):
+    """Resumo de referência (aba 7) em streaming; se já existir, é entregue de uma vez."""
+    if pipeline_artifacts.is_computed('reference_summary', episode_id=episode_id, season=season):
+        yield get_artifact('reference_summary', episode_id, season)
+        return
+    prompt = episode_summary_prompt(episode_id, season)
+    if prompt is None:
+        yield "Episódio não encontrado."
+        return
+    yield from _stream_artifact('reference_summary', episode_id, season, generate_text_stream(prompt))
+
+def stream_final_summary(episode_id, season):
     """
-    
-    evaluation = generate_text(evaluation_prompt)
-    
-    chunk_evaluations = []
-    for i, chunk_summary in enumerate(chunk_summaries):
-        chunk_eval_prompt = f"""
-        Avalie o seguinte resumo de uma parte do episódio {episode_id} da temporada {season} dos Simpsons quanto à veracidade e coerência:
+    Resumo final do pipeline por chunks em streaming.
 
-        {chunk_summary}
+    Os resumos dos chunks (e o tree-reduce, se necessário) são calculados antes;
+    o texto começa a chegar assim que o prompt final é enviado.
+    """
+    if pipeline_artifacts.is_computed('final_summary', episode_id=episode_id, season=season):
+        yield get_artifact('final_summary', episode_id, season)
+        return
+    level = reduce_summaries(
+        get_artifact('chunk_summaries', episode_id, season),
+        reduce_fn=combine_summaries,
+        final_fn=lambda summaries: summaries,
+        count_tokens=count_tokens,
+        reduce_budget=SUMMARY_REDUCE_BUDGET,
+    )
+    prompt = final_summary_prompt(episode_id, season, level)
+    yield from _stream_artifact('final_summary', episode_id, season, generate_text_stream(prompt))
 
-        Forneça uma breve análise sobre a qualidade deste resumo parcial.
-        """
-        chunk_evaluations.append(generate_text(chunk_eval_prompt))
-    
-    reference_summary = analyze_episode(episode_id, season)[0]  # Assumindo que esta função retorna o resumo simples
+def analyze_episode_summary(episode_id, season):
+    chunks = get_artifact('chunks', episode_id, season)
+    final_summary = get_artifact('final_summary', episode_id, season)
+    evaluation = get_artifact('evaluation', episode_id, season)
+    chunk_summaries = get_artifact('chunk_summaries', episode_id, season)
+    chunk_evaluations = get_artifact('chunk_evaluations', episode_id, season)
+    reference_summary = get_artifact('reference_summary', episode_id, season)
     
-    return final_summary, num_chunks, evaluation, chunk_summaries, chunk_evaluations, reference_summary
-
+    return final_summary, len(chunks), evaluation, chunk_summaries, chunk_evaluations, reference_summary
 
 
 
@@ -0,0 +1,451 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Camada de acesso aos dados dos Simpsons.
+# O merge de episódios + falas é construído uma única vez num snapshot Parquet
+# e recarregado (com projeção de colunas) enquanto os CSVs de origem não mudarem.
+# O snapshot é ordenado por (season, episode_id, number), de modo que as falas de
+# cada episódio ocupam um intervalo contíguo de linhas, registrado no manifesto.
+#
+# No modo lean (padrão), cada chamador carrega só as colunas de que precisa
+# (CALLER_COLUMNS) e com tipos compactos: nomes de personagens/locais e demais
+# textos repetidos viram categóricas, números são reduzidos ao menor tipo que
+# comporta os valores e o texto livre fica em strings Arrow. O modo legacy
+# devolve as colunas como objetos Python, como o carregamento original.
+
+DATA_DIR = os.getenv('SIMPSONS_DATA_DIR', 'data')
+CACHE_DIR = os.getenv('SIMPSONS_CACHE_DIR', os.path.join(DATA_DIR, 'cache'))
+
+EPISODES_CSV = os.path.join(DATA_DIR, 'simpsons_episodes.csv')
+SCRIPT_LINES_CSV = os.path.join(DATA_DIR, 'simpsons_script_lines.csv')
+SNAPSHOT_PATH = os.path.join(CACHE_DIR, 'simpsons_merged.parquet')
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'simpsons_merged.json')
+
+SNAPSHOT_VERSION = 3
+
+# 'lean' (projeção e tipos compactos) ou 'legacy' (objetos Python)
+SIMPSONS_LOAD_MODE = os.getenv('SIMPSONS_LOAD_MODE', 'lean')
+
+# Colunas vindas de simpsons_script_lines.csv no snapshot (o 'id' da fala vira 'id_y' no merge)
+SCRIPT_LINE_COLUMNS = [
+    'episode_id', 'number', 'raw_text', 'timestamp_in_ms', 'speaking_line',
+    'character_id', 'location_id', 'raw_character_text', 'raw_location_text',
+    'spoken_words', 'normalized_text', 'word_count',
+]
+
+# Colunas que cada chamador usa
+CALLER_COLUMNS = {
+    'app': ['season', 'episode_id', 'number', 'imdb_rating', 'us_viewers_in_millions', 'spoken_words'],
+    'sentiment': SCRIPT_LINE_COLUMNS + ['season'],
+    'summary': ['season', 'episode_id', 'number', 'spoken_words'],
+    'tokens': ['spoken_words'],
+    'token_stats': ['episode_id', 'season', 'id_y'],
+}
+
+# Textos com poucos valores distintos (os do episódio se repetem em todas as suas falas)
+CATEGORICAL_COLUMNS = {
+    'raw_character_text', 'raw_location_text', 'title', 'image_url', 'video_url',
+    'original_air_date', 'production_code',
+}
+# Colunas numéricas; algumas chegam como texto no snapshot por causa de linhas malformadas do CSV
+NUMERIC_COLUMNS = {
+    'id_x', 'id_y', 'episode_id', 'season', 'number', 'timestamp_in_ms', 'character_id', 'location_id',
+    'word_count', 'imdb_rating', 'imdb_votes', 'number_in_season', 'number_in_series',
+    'original_air_year', 'us_viewers_in_millions', 'views',
+}
+BOOLEAN_COLUMNS = {'speaking_line'}
+# texto aceito como número nas colunas numéricas lidas como string (ex.: "12", "-3.5", "1e3")
+NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+
+def _file_hash(path, block_size=1 << 20):
+    """Calcula o sha256 do arquivo em blocos, sem carregá-lo inteiro na memória."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def atomic_write(path, write):
+    """
+    Grava um arquivo via temporário + os.replace, sem que leitores vejam o arquivo pela metade.
+
+    O temporário tem nome único no mesmo diretório: processos que gravam o mesmo
+    arquivo ao mesmo tempo (ex.: workers do sentiment_batch) não se atrapalham.
+
+    :param path: Arquivo de destino
+    :param write: Função que recebe o caminho do temporário e grava nele
+    """
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.', suffix='.tmp', delete=False) as file:
+        tmp_path = file.name
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_manifest(manifest):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2)
+    atomic_write(MANIFEST_PATH, write)
+
+
+def _snapshot_is_fresh(manifest):
+    """
+    Verifica se o snapshot ainda corresponde aos CSVs de origem.
+
+    Primeiro compara tamanho e mtime (barato); só recalcula o hash quando
+    o mtime mudou, para não invalidar o snapshot por um simples "touch".
+    """
+    if manifest is None or manifest.get('version') != SNAPSHOT_VERSION:
+        return False
+    if not os.path.exists(SNAPSHOT_PATH):
+        return False
+
+    touched = False
+    for path in (EPISODES_CSV, SCRIPT_LINES_CSV):
+        recorded = manifest['sources'].get(os.path.basename(path))
+        if recorded is None:
+            return False
+        current = _source_stat(path)
+        if current['size'] != recorded['size']:
+            return False
+        if current['mtime_ns'] != recorded['mtime_ns']:
+            if _file_hash(path) != recorded['sha256']:
+                return False
+            recorded['mtime_ns'] = current['mtime_ns']
+            touched = True
+
+    if touched:
+        _write_manifest(manifest)
+    return True
+
+
+def _normalize_for_parquet(df):
+    # O CSV de falas tem colunas com tipos misturados (low_memory=False as deixa como object);
+    # o Parquet exige um tipo por coluna, então os valores não nulos viram str.
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def _read_source_csvs():
+    episodes = pd.read_csv(EPISODES_CSV, dtype={'id': 'int32', 'season': 'int32'})
+    script_lines = pd.read_csv(SCRIPT_LINES_CSV, low_memory=False, dtype={'episode_id': 'int32'})
+    # junção pelas falas (como o carregamento original): falas cujo episódio não está em
+    # simpsons_episodes.csv ficam no snapshot, com as colunas do episódio nulas
+    combined_data = pd.merge(episodes, script_lines, left_on='id', right_on='episode_id', how='right')
+    combined_data = combined_data.astype({'id_x': 'Int32', 'season': 'Int32'})
+    combined_data = combined_data.sort_values(
+        ['season', 'episode_id', 'number'],
+        key=lambda column: pd.to_numeric(column, errors='coerce'),
+        kind='stable',
+    )
+    return combined_data.reset_index(drop=True)
+
+
+def _index_key(season, episode_id):
+    return f"{int(season)}:{int(episode_id)}"
+
+
+def _build_episode_index(combined_data):
+    # Como o frame está ordenado, cada (season, episode_id) começa onde o par muda.
+    # Falas sem temporada (episódio ausente do CSV de episódios) ficam no fim e fora do índice.
+    combined_data = combined_data[combined_data['season'].notna()]
+    keys = combined_data['season'].to_numpy(dtype='int64'), combined_data['episode_id'].to_numpy(dtype='int64')
+    starts = np.flatnonzero(
+        np.r_[True, (keys[0][1:] != keys[0][:-1]) | (keys[1][1:] != keys[1][:-1])]
+    )
+    stops = np.r_[starts[1:], len(combined_data)]
+    return {
+        _index_key(keys[0][start], keys[1][start]): [int(start), int(stop)]
+        for start, stop in zip(starts, stops)
+    }
+
+
+def build_snapshot():
+    """Lê os CSVs, faz o merge e grava o snapshot Parquet com o manifesto das fontes."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    combined_data = _normalize_for_parquet(_read_source_csvs())
+    episode_index = _build_episode_index(combined_data)
+
+    table = pa.Table.from_pandas(combined_data, preserve_index=False)
+    atomic_write(SNAPSHOT_PATH, lambda tmp_path: pq.write_table(table, tmp_path))
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'rows': table.num_rows,
+        'episode_index': episode_index,
+        'sources': {
+            os.path.basename(path): {**_source_stat(path), 'sha256': _file_hash(path)}
+            for path in (EPISODES_CSV, SCRIPT_LINES_CSV)
+        },
+    }
+    _write_manifest(manifest)
+    return manifest
+
+
+def ensure_snapshot():
+    """Garante que o snapshot existe e está atualizado, reconstruindo-o se necessário."""
+    manifest = _read_manifest()
+    if not _snapshot_is_fresh(manifest):
+        manifest = build_snapshot()
+    return manifest
+
+
+def _snapshot_signature(manifest):
+    return tuple(source['sha256'] for source in manifest['sources'].values())
+
+
+def snapshot_signature():
+    """Identificador do snapshot atual, usado por artefatos derivados (ex.: coluna de tokens)."""
+    return ':'.join(_snapshot_signature(ensure_snapshot()))
+
+
+def columns_for(caller):
+    """Colunas usadas pelo chamador (ver CALLER_COLUMNS)."""
+    return list(CALLER_COLUMNS[caller])
+
+
+def downcast(column):
+    """
+    Reduz uma coluna numérica Arrow ao menor tipo que comporta seus valores.
+
+    Floats com valores inteiros viram inteiros; os demais floats viram float32.
+    """
+    if column.null_count == len(column):
+        return column
+    if pa.types.is_floating(column.type):
+        values = column.drop_null().to_numpy()
+        if not np.array_equal(values, np.floor(values)):
+            return column.cast(pa.float32())
+    elif not pa.types.is_integer(column.type):
+        return column
+    bounds = pc.min_max(column)
+    low, high = bounds['min'].as_py(), bounds['max'].as_py()
+    for int_type in (pa.int8(), pa.int16(), pa.int32(), pa.int64()):
+        info = np.iinfo(int_type.to_pandas_dtype())
+        if info.min <= low and high <= info.max:
+            return column.cast(int_type)
+    return column
+
+
+def _lean_column(name, column):
+    if name in CATEGORICAL_COLUMNS and pa.types.is_string(column.type):
+        return column.dictionary_encode()
+    if name in NUMERIC_COLUMNS:
+        if pa.types.is_string(column.type):
+            # valores que não são números (linhas malformadas do CSV) viram nulos
+            column = pc.utf8_trim_whitespace(column)
+            column = pc.if_else(pc.match_substring_regex(column, NUMBER_PATTERN), column, pa.scalar(None, pa.string()))
+            column = pc.cast(column, pa.float64())
+        return downcast(column)
+    if name in BOOLEAN_COLUMNS and pa.types.is_string(column.type):
+        return pc.equal(pc.utf8_lower(column), 'true')
+    return column
+
+
+def lean_table(table):
+    """Converte as colunas de uma tabela do snapshot para os tipos compactos do modo lean."""
+    return pa.table({name: _lean_column(name, table.column(name)) for name in table.column_names})
+
+
+def arrow_types_mapper(arrow_type):
+    # colunas dictionary viram pd.Categorical; as demais ficam em Arrow (strings inclusive)
+    if pa.types.is_dictionary(arrow_type):
+        return None
+    return pd.ArrowDtype(arrow_type)
+
+
+def to_frame(table, lean=True):
+    """DataFrame de uma tabela do snapshot: tipos Arrow/categóricas (lean) ou objetos Python (legacy)."""
+    if lean:
+        return table.to_pandas(types_mapper=arrow_types_mapper)
+    return table.to_pandas()
+
+
+def _is_lean(lean):
+    return SIMPSONS_LOAD_MODE == 'lean' if lean is None else lean
+
+
+# Tabelas Arrow já lidas neste processo, por (assinatura do snapshot, colunas, lean)
+_tables = {}
+
+
+def _load_table(columns=None, lean=False):
+    manifest = ensure_snapshot()
+    signature = _snapshot_signature(manifest)
+    key = (signature, tuple(columns) if columns is not None else None, lean)
+    if key not in _tables:
+        for stale_key in [k for k in _tables if k[0] != signature]:
+            del _tables[stale_key]
+        if lean:
+            # as categóricas já são lidas do Parquet como dictionary, sem materializar as strings
+            names = columns if columns is not None else pq.read_schema(SNAPSHOT_PATH).names
+            table = pq.read_table(SNAPSHOT_PATH, columns=columns,
+                                  read_dictionary=[name for name in names if name in CATEGORICAL_COLUMNS])
+            _tables[key] = lean_table(table)
+        else:
+            _tables[key] = pq.read_table(SNAPSHOT_PATH, columns=columns)
+    return _tables[key], manifest
+
+
+def load_simpsons_data(columns=None, lean=None):
+    """
+    Carrega o merge de episódios e falas a partir do snapshot Parquet.
+
+    :param columns: Lista de colunas a carregar (None carrega todas; ver columns_for)
+    :param lean: Tipos compactos (padrão: SIMPSONS_LOAD_MODE)
+    :return: DataFrame com os dados combinados
+    """
+    lean = _is_lean(lean)
+    table, _ = _load_table(columns, lean)
+    return to_frame(table, lean)
+
+
+def get_episode_lines(season, episode_id, columns=None, lean=None):
+    """
+    Retorna as falas de um episódio, ordenadas por 'number'.
+
+    A busca usa o índice de episódios do manifesto: é uma fatia do snapshot,
+    sem máscaras booleanas sobre o corpus inteiro.
+
+    :param season: Temporada do episódio
+    :param episode_id: ID do episódio
+    :param columns: Lista de colunas a carregar (None carrega todas)
+    :param lean: Tipos compactos (padrão: SIMPSONS_LOAD_MODE)
+    :return: DataFrame com as falas do episódio (vazio se não existir)
+    """
+    lean = _is_lean(lean)
+    table, manifest = _load_table(columns, lean)
+    start, stop = manifest['episode_index'].get(_index_key(season, episode_id), (0, 0))
+    episode_lines = to_frame(table.slice(start, stop - start), lean)
+    episode_lines.index = pd.RangeIndex(start, stop)
+    return episode_lines
+
+
+def list_episodes(first_season=None, last_season=None):
+    """
+    Lista os episódios do snapshot, em ordem.
+
+    :param first_season: Primeira temporada incluída (None: desde a primeira)
+    :param last_season: Última temporada incluída (None: até a última)
+    :return: Lista de pares (season, episode_id)
+    """
+    episodes = []
+    for key in ensure_snapshot()['episode_index']:
+        season, episode_id = (int(part) for part in key.split(':'))
+        if first_season is not None and season < first_season:
+            continue
+        if last_season is not None and season > last_season:
+            continue
+        episodes.append((season, episode_id))
+    return sorted(episodes)
+
+
+def _peak_rss_bytes():
+    # VmHWM é zerado no exec; o ru_maxrss do filho herdaria o pico do processo pai
+    try:
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em bytes no macOS e em KB no Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _measure(mode, caller=None):
+    # executado num processo separado, para que o pico de RSS seja só desta carga
+    columns = columns_for(caller) if caller else None
+    baseline = _peak_rss_bytes()
+    frame = load_simpsons_data(columns, lean=mode == 'lean')
+    return {
+        'mode': mode,
+        'caller': caller,
+        'columns': len(frame.columns),
+        'rows': len(frame),
+        'frame_bytes': int(frame.memory_usage(deep=True).sum()),
+        'peak_rss_bytes': _peak_rss_bytes() - baseline,
+    }
+
+
+def memory_report(callers=None):
+    """
+    Compara a memória do carregamento legacy (todas as colunas, objetos Python) com o modo lean.
+
+    Cada carga roda num processo novo; peak_rss_bytes é o quanto o pico de RSS cresceu
+    durante a carga (sem contar a importação do pandas/pyarrow).
+
+    :param callers: Chamadores medidos no modo lean (padrão: todos de CALLER_COLUMNS)
+    :return: Lista de dicts (mode, caller, columns, rows, frame_bytes, peak_rss_bytes)
+    """
+    ensure_snapshot()
+    runs = [('legacy', None), ('lean', None)] + [('lean', caller) for caller in (callers or CALLER_COLUMNS)]
+    report = []
+    for mode, caller in runs:
+        command = [sys.executable, os.path.abspath(__file__), '--measure', mode] + (['--caller', caller] if caller else [])
+        output = subprocess.check_output(command, text=True, env={**os.environ, 'SIMPSONS_LOAD_MODE': mode})
+        report.append(json.loads(output.strip().splitlines()[-1]))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot e memória do corpus dos Simpsons.")
+    parser.add_argument('--memory-report', action='store_true', help="Compara a memória dos modos legacy e lean")
+    parser.add_argument('--measure', choices=['legacy', 'lean'], help=argparse.SUPPRESS)
+    parser.add_argument('--caller', choices=sorted(CALLER_COLUMNS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(_measure(args.measure, args.caller)))
+        return
+    if not args.memory_report:
+        manifest = ensure_snapshot()
+        print(f"Snapshot com {manifest['rows']} falas em {SNAPSHOT_PATH}")
+        return
+
+    report = memory_report()
+    legacy = report[0]
+    print(f"{'modo':<8} {'chamador':<12} {'colunas':>8} {'frame MB':>10} {'pico RSS MB':>12} {'redução':>8}")
+    for row in report:
+        reduction = legacy['peak_rss_bytes'] / row['peak_rss_bytes'] if row['peak_rss_bytes'] else float('inf')
+        print(f"{row['mode']:<8} {row['caller'] or 'todas':<12} {row['columns']:>8} "
+              f"{row['frame_bytes'] / 2 ** 20:>10.1f} {row['peak_rss_bytes'] / 2 ** 20:>12.1f} {reduction:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
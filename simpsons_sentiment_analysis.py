@@ -1,11 +1,14 @@
-﻿import pandas as pd
-import numpy as np
-from dotenv import load_dotenv
+﻿from dotenv import load_dotenv
 import os
 import json
-from openai import OpenAI
+import threading
+
+import simpsons_data
+from llm_cache import cached_completion, create_completion
+import llm_telemetry
+from llm_executor import default_rate_limiter, run_ordered
+from simpsons_tokens import count_tokens, count_tokens_batch
 
-import json
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
@@ -19,19 +22,191 @@ TEMPERATURE = float(os.getenv('TEMPERATURE'))
 TOP_P = float(os.getenv('TOP_P'))
 MAX_TOKENS = int(os.getenv('MAX_TOKENS'))
 
-client = OpenAI(
-    base_url=OPENAI_BASE_URL,
-    api_key=OPENAI_API_KEY
-)
+# tokens aproximados das instruções fixas do prompt de classificação
+PROMPT_OVERHEAD_TOKENS = 200
+
+# Orçamento dos lotes de classificação: falas por prompt e fração de MAX_TOKENS
+# reservada para a resposta (a folga evita respostas truncadas)
+SENTIMENT_PROMPT_BUDGET = int(os.getenv('SENTIMENT_PROMPT_BUDGET', '2048'))
+COMPLETION_BUDGET_RATIO = 0.8
+# tokens de resposta por fala no formato {"<id>": "<rótulo>", ...}
+RESPONSE_TOKENS_PER_LINE = 8
+# tokens do prefixo "<id>: " de cada fala no prompt
+LINE_ID_TOKENS = 3
+
+SENTIMENT_LABELS = ('positive', 'neutral', 'negative')
+
+# Cascata: o léxico do VADER (nltk) classifica as falas primeiro e só as de baixa
+# confiança vão para o LLM
+SENTIMENT_CASCADE = os.getenv('SENTIMENT_CASCADE', '').lower() in ('1', 'true', 'yes')
+SENTIMENT_CASCADE_THRESHOLD = float(os.getenv('SENTIMENT_CASCADE_THRESHOLD', '0.6'))
+# faixa de 'compound' que o VADER considera neutra
+VADER_NEUTRAL_BAND = 0.05
+
+# Cliente OpenAI, criado no primeiro uso
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(
+            base_url=OPENAI_BASE_URL,
+            api_key=OPENAI_API_KEY,
+            # as novas tentativas ficam em llm_cache.create_completion, que as registra na telemetria
+            max_retries=0
+        )
+    return _client
 
 def load_simpsons_data():
-    episodes = pd.read_csv('data/simpsons_episodes.csv')
-    script_lines = pd.read_csv('data/simpsons_script_lines.csv', low_memory=False)
-    combined_data = pd.merge(script_lines, episodes[['id', 'season']], left_on='episode_id', right_on='id', how='left')
-    return combined_data
+    return simpsons_data.load_simpsons_data(columns=simpsons_data.columns_for('sentiment'))
+
+
+def _dedup_key(episode_lines):
+    # falas repetidas ("D'oh!", "Woo-hoo!") são agrupadas pelo texto normalizado
+    keys = episode_lines['normalized_text'] if 'normalized_text' in episode_lines else episode_lines['spoken_words']
+    return keys.fillna(episode_lines['spoken_words'].str.lower())
+
+
+def plan_batches(episode_lines, prompt_budget=SENTIMENT_PROMPT_BUDGET, completion_budget=None):
+    """
+    Remove falas duplicadas e agrupa as restantes em lotes limitados por tokens.
+
+    Cada lote é preenchido até o orçamento de prompt (só as falas) ou até a resposta
+    estimada atingir o orçamento de completion, o que ocorrer primeiro.
+
+    :param episode_lines: DataFrame com 'spoken_words' (e, se houver, 'normalized_text')
+    :param prompt_budget: Tokens de falas por requisição
+    :param completion_budget: Tokens de resposta por requisição (padrão: fração de MAX_TOKENS)
+    :return: Lista de lotes; cada lote é uma lista de pares (chave de deduplicação, fala)
+    """
+    if completion_budget is None:
+        completion_budget = int(MAX_TOKENS * COMPLETION_BUDGET_RATIO)
+
+    spoken = episode_lines[episode_lines['spoken_words'].notna()]
+    unique_lines = spoken.assign(_key=_dedup_key(spoken)).drop_duplicates('_key')
+
+    keys = unique_lines['_key'].tolist()
+    texts = unique_lines['spoken_words'].tolist()
+    token_counts = count_tokens_batch(texts)
+
+    batches = []
+    batch, prompt_tokens, completion_tokens = [], 0, 0
+    for key, text, tokens in zip(keys, texts, token_counts):
+        line_prompt = int(tokens) + LINE_ID_TOKENS + 1
+        line_completion = RESPONSE_TOKENS_PER_LINE
+        if batch and (prompt_tokens + line_prompt > prompt_budget
+                      or completion_tokens + line_completion > completion_budget):
+            batches.append(batch)
+            batch, prompt_tokens, completion_tokens = [], 0, 0
+        batch.append((key, text))
+        prompt_tokens += line_prompt
+        completion_tokens += line_completion
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+_lexicon_analyzer = None
+
+def get_lexicon_analyzer():
+    global _lexicon_analyzer
+    if _lexicon_analyzer is None:
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        try:
+            _lexicon_analyzer = SentimentIntensityAnalyzer()
+        except LookupError:
+            import nltk
+            nltk.download('vader_lexicon', quiet=True)
+            _lexicon_analyzer = SentimentIntensityAnalyzer()
+    return _lexicon_analyzer
+
+
+def lexicon_sentiment(text):
+    """
+    Classifica uma fala com o léxico do VADER.
+
+    A confiança é |compound| para positive/negative e a proporção de palavras
+    neutras para neutral (1.0 quando a fala não tem nenhuma palavra do léxico).
+
+    :param text: Fala
+    :return: (rótulo, confiança entre 0 e 1)
+    """
+    scores = get_lexicon_analyzer().polarity_scores(text)
+    compound = scores['compound']
+    if compound >= VADER_NEUTRAL_BAND:
+        return 'positive', compound
+    if compound <= -VADER_NEUTRAL_BAND:
+        return 'negative', -compound
+    return 'neutral', scores['neu']
+
+
+def pre_classify(episode_lines, threshold=SENTIMENT_CASCADE_THRESHOLD):
+    """
+    Primeiro estágio da cascata: rótulos do léxico para as falas em que ele é confiante.
+
+    :param episode_lines: DataFrame com 'spoken_words' (e, se houver, 'normalized_text')
+    :param threshold: Confiança mínima para aceitar o rótulo do léxico
+    :return: dict chave de deduplicação -> rótulo (só as falas aceitas)
+    """
+    spoken = episode_lines[episode_lines['spoken_words'].notna()]
+    unique_lines = spoken.assign(_key=_dedup_key(spoken)).drop_duplicates('_key')
+    labels = {}
+    for key, text in zip(unique_lines['_key'].tolist(), unique_lines['spoken_words'].tolist()):
+        label, confidence = lexicon_sentiment(text)
+        if confidence >= threshold:
+            labels[key] = label
+    return labels
 
 
-def classify_sentiment(texts, examples):
+def _strip_code_fence(content):
+    # remove crases (```json ... ```) e espaços em branco no início e no final
+    content = content.strip().strip('`').strip()
+    if content[:4].lower() == 'json':
+        content = content[4:]
+    return content
+
+
+def _is_json_response(content):
+    # só respostas que decodificam como JSON vão para o cache
+    try:
+        json.loads(_strip_code_fence(content))
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def _labels_by_position(parsed, num_lines):
+    """Converte {"<id>": "<rótulo>"} (ou uma lista de rótulos) numa lista alinhada com as falas."""
+    if isinstance(parsed, list):
+        parsed = {str(i): label for i, label in enumerate(parsed, start=1)}
+    labels = [None] * num_lines
+    if not isinstance(parsed, dict):
+        return labels
+    for line_id, label in parsed.items():
+        try:
+            position = int(line_id) - 1
+        except (TypeError, ValueError):
+            continue
+        label = str(label).strip().lower()
+        if 0 <= position < num_lines and label in SENTIMENT_LABELS:
+            labels[position] = label
+    return labels
+
+
+def classify_sentiment(lines, examples, bypass_cache=False):
+    """
+    Classifica uma lista de falas como positive, neutral ou negative.
+
+    As falas são enviadas numeradas e o modelo responde apenas {"<id>": "<rótulo>"};
+    a resposta volta para as falas pela posição, sem junção por texto.
+
+    :param lines: Lista de falas
+    :param examples: Exemplos few-shot
+    :return: Lista de rótulos alinhada com lines (None quando o modelo não classificou a fala)
+    """
+    texts = '\n'.join(f"{i}: {line}" for i, line in enumerate(lines, start=1))
     prompt = f"""
     ### Instructions:
     You are an expert in human communication and marketing, specialized in sentiment analysis.
@@ -44,43 +219,80 @@ def classify_sentiment(texts, examples):
     ### Examples:
     {examples}
 
-    Given this information, respond in JSON with the classification of these other lines as positive,
-    negative or neutral. The response should contain only the json with the classification, without any
-    additional information.
+    Given this information, classify each of the numbered lines below as positive, negative or neutral.
+    Respond with a single JSON object mapping each line number to its classification, for example
+    {{"1": "neutral", "2": "positive"}}. Do not repeat the lines and do not add any other information.
 
     ### Lines:
     {texts}
     """
     
     try:
-        completion = client.chat.completions.create(
+        response = cached_completion(
+            get_client(),
             model=OPENAI_MODEL,
             messages=[{"role": "user", "content": prompt}],
             temperature=TEMPERATURE,
             top_p=TOP_P,
-            max_tokens=MAX_TOKENS
+            max_tokens=MAX_TOKENS,
+            bypass=bypass_cache,
+            validate=_is_json_response,
+            caller='classify_sentiment'
         )
-        logging.debug(f"API Response: {completion.choices[0].message.content}")
+        logging.debug(f"API Response: {response}")
         
-        # remove crases e espaços em branco no início e no final
-        content = completion.choices[0].message.content.strip().strip('`')
+        content = _strip_code_fence(response)
         
         # resposta como JSON
         try:
-            return json.loads(content)
+            return _labels_by_position(json.loads(content), len(lines))
         except json.JSONDecodeError as json_err:
             logging.error(f"JSON Decode Error: {json_err}")
             logging.error(f"Cleaned content: {content}")
-            
-            return eval(content)
+            return [None] * len(lines)
     
     except Exception as e:
         logging.error(f"Error calling API: {str(e)}")
-        return {}
+        return [None] * len(lines)
+
+def _read_checkpoint(checkpoint_path):
+    """Rótulos já gravados no checkpoint, por chave de deduplicação."""
+    completed = {}
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return completed
+    with open(checkpoint_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # última linha incompleta de uma execução interrompida
+                continue
+            completed.update(entry['labels'])
+    return completed
+
+
+def analyze_simpsons_sentiments(update_progress=None, max_workers=None, rate_limiter=None,
+                                season=5, episode_id=92, checkpoint_path=None, cascade=None, threshold=None):
+    """
+    Classifica o sentimento das falas de um episódio (padrão: episódio 92 da temporada 5).
+
+    Com checkpoint_path, cada lote classificado é gravado (JSON lines) assim que termina;
+    numa nova execução os lotes já gravados não são enviados de novo ao LLM.
+
+    Com cascade, as falas em que o léxico do VADER é confiante não vão para o LLM. A coluna
+    'sentiment_stage' indica qual estágio ('lexicon' ou 'llm') classificou cada fala.
 
-def analyze_simpsons_sentiments(update_progress=None):
-    data = load_simpsons_data()
-    episode_lines = data[(data['episode_id'] == 92) & (data['season'] == 5)].copy()
+    :param update_progress: Callback chamado com a fração de lotes concluídos
+    :param max_workers: Chamadas simultâneas ao LLM (padrão: LLM_MAX_WORKERS)
+    :param rate_limiter: RateLimiter de requisições/tokens por minuto (padrão: configurado pelo .env)
+    :param season: Temporada do episódio
+    :param episode_id: ID do episódio
+    :param checkpoint_path: Arquivo de checkpoint dos lotes (opcional)
+    :param cascade: Pré-classifica com o léxico (padrão: SENTIMENT_CASCADE)
+    :param threshold: Confiança mínima do léxico (padrão: SENTIMENT_CASCADE_THRESHOLD)
+    :return: (falas classificadas, distribuição, None, None, número de chamadas feitas)
+    """
+    episode_lines = simpsons_data.get_episode_lines(season, episode_id, columns=simpsons_data.columns_for('sentiment'))
     
     examples = """
     Positive:
@@ -105,35 +317,70 @@ def analyze_simpsons_sentiments(update_progress=None):
     - "Not so fast, Simpson. Your reign of terror over the power plant ends now."
     """
     
-    batch_size = 20
-    lines = episode_lines['spoken_words'].dropna().tolist()
-    batches = [lines[i:i + batch_size] for i in range(0, len(lines), batch_size)]
-    
-    results = {}
-    num_calls = 0
-    
-    for i, batch in enumerate(batches):
-        text = '\n'.join(batch)
-        batch_results = classify_sentiment(text, examples)
-        if batch_results:
-            if isinstance(batch_results, dict):
-                results.update(batch_results)
-            elif isinstance(batch_results, list):
-                for item in batch_results:
-                    if 'line' in item and ('classification' in item or 'sentiment' in item):
-                        key = item.get('line') or item.get('Line')
-                        value = item.get('classification') or item.get('sentiment') or item.get('Classification') or item.get('Sentiment')
-                        results[key] = value
-        num_calls += 1
-        
-        if update_progress:
-            update_progress((i + 1) / len(batches))
+    if cascade is None:
+        cascade = SENTIMENT_CASCADE
+    if threshold is None:
+        threshold = SENTIMENT_CASCADE_THRESHOLD
+    
+    keys = _dedup_key(episode_lines)
+    lexicon_labels = {}
+    if cascade:
+        try:
+            lexicon_labels = pre_classify(episode_lines, threshold)
+        except LookupError as e:
+            # léxico indisponível (sem rede para baixá-lo): todas as falas vão para o LLM
+            logging.warning(f"VADER lexicon unavailable, skipping cascade: {e}")
+    
+    # o checkpoint guarda rótulos por fala: só as falas ainda sem rótulo entram nos lotes
+    completed = _read_checkpoint(checkpoint_path)
+    pending = plan_batches(episode_lines[~keys.isin(lexicon_labels) & ~keys.isin(completed)])
+    checkpoint_lock = threading.Lock()
+    
+    def classify_batch(batch):
+        labels = classify_sentiment([text for _, text in batch], examples)
+        # falas que o modelo não classificou não entram no checkpoint e são refeitas na próxima execução
+        classified = {key: label for (key, _), label in zip(batch, labels) if label is not None}
+        if checkpoint_path is not None and classified:
+            with checkpoint_lock, open(checkpoint_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({'labels': classified}) + '\n')
+        return labels
     
-    # novo DataFrame ds frases classificadas
-    classified_lines = pd.DataFrame(list(results.items()), columns=['spoken_words', 'sentiment'])
+    def batch_cost(batch):
+        # prompt (falas + instruções/exemplos) mais o orçamento de resposta
+        texts = '\n'.join(text for _, text in batch)
+        return count_tokens(examples) + count_tokens(texts) + PROMPT_OVERHEAD_TOKENS + MAX_TOKENS
     
-    # join com o DataFrame original
-    classified_episode_lines = pd.merge(episode_lines, classified_lines, on='spoken_words', how='left')
+    if rate_limiter is None:
+        rate_limiter = default_rate_limiter()
+    
+    pending_labels = run_ordered(
+        classify_batch, pending,
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        cost=batch_cost,
+        on_progress=update_progress,
+    )
+    num_calls = len(pending)
+    
+    # os rótulos voltam por posição dentro de cada lote; cada fala recebe o rótulo
+    # da sua chave de deduplicação (inclusive as repetidas)
+    sentiment_by_key = dict(completed)
+    for batch, labels in zip(pending, pending_labels):
+        for (key, _), label in zip(batch, labels):
+            # uma fala que o modelo não classificou nunca apaga um rótulo já conhecido
+            if label is not None:
+                sentiment_by_key[key] = label
+    
+    classified_episode_lines = episode_lines.copy()
+    classified_episode_lines['sentiment'] = keys.map(sentiment_by_key)
+    classified_episode_lines['sentiment_stage'] = classified_episode_lines['sentiment'].notna().map({True: 'llm', False: None})
+    from_lexicon = keys.isin(lexicon_labels)
+    classified_episode_lines.loc[from_lexicon, 'sentiment'] = keys[from_lexicon].map(lexicon_labels)
+    classified_episode_lines.loc[from_lexicon, 'sentiment_stage'] = 'lexicon'
+    classified_episode_lines.loc[episode_lines['spoken_words'].isna(), ['sentiment', 'sentiment_stage']] = None
+    
+    stage_counts = classified_episode_lines['sentiment_stage'].value_counts()
+    logging.info(f"Sentiment stages: {stage_counts.to_dict()} ({num_calls} LLM calls)")
     
     distribution = classified_episode_lines['sentiment'].value_counts(normalize=True)
     
@@ -143,13 +390,16 @@ def test_api_connection():
     try:
         print(f"Attempting to connect to {OPENAI_BASE_URL}")
         print(f"Using model: {OPENAI_MODEL}")
-        completion = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": "Hello"}],
-            temperature=TEMPERATURE,
-            top_p=TOP_P,
-            max_tokens=MAX_TOKENS
-        )
+        with llm_telemetry.track('test_api_connection', OPENAI_MODEL) as call:
+            completion = create_completion(
+                get_client(), call,
+                model=OPENAI_MODEL,
+                messages=[{"role": "user", "content": "Hello"}],
+                temperature=TEMPERATURE,
+                top_p=TOP_P,
+                max_tokens=MAX_TOKENS
+            )
+            call.usage_from_response(completion)
         print("API connection successful!")
         print(f"Response: {completion.choices[0].message.content}")
         return True
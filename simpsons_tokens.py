@@ -0,0 +1,228 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import tiktoken
+
+import simpsons_data
+
+# Contagem de tokens do corpus dos Simpsons.
+# A codificação é obtida uma única vez e as falas são tokenizadas em lote
+# (encode_ordinary_batch usa um pool de threads); o resultado fica persistido
+# numa coluna Parquet alinhada, linha a linha, com o snapshot de simpsons_data.
+
+ENCODING_NAME = 'cl100k_base'
+TOKENS_PATH = os.path.join(simpsons_data.CACHE_DIR, 'simpsons_tokens.parquet')
+TOKENS_NUM_THREADS = int(os.getenv('TOKENS_NUM_THREADS', os.cpu_count() or 4))
+TOKENS_BATCH_SIZE = 8192
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name=ENCODING_NAME):
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text):
+    if pd.isna(text):
+        return 0
+    return len(get_encoding().encode_ordinary(str(text)))
+
+
+def count_tokens_batch(texts, num_threads=TOKENS_NUM_THREADS, batch_size=TOKENS_BATCH_SIZE):
+    """
+    Conta os tokens de uma sequência de textos (valores nulos contam 0).
+
+    :param texts: Sequência (lista ou Series) de textos
+    :param num_threads: Threads usadas pelo tiktoken em cada lote
+    :param batch_size: Quantidade de textos codificados por lote
+    :return: Array numpy (int32) com a contagem de cada texto, na mesma ordem
+    """
+    texts = pd.Series(texts, dtype=object)
+    counts = np.zeros(len(texts), dtype=np.int32)
+    present = np.flatnonzero(texts.notna().to_numpy())
+    values = texts.to_numpy()[present]
+
+    encoding = get_encoding()
+    for start in range(0, len(present), batch_size):
+        batch = [str(value) for value in values[start:start + batch_size]]
+        encoded = encoding.encode_ordinary_batch(batch, num_threads=num_threads)
+        counts[present[start:start + batch_size]] = [len(tokens) for tokens in encoded]
+    return counts
+
+
+def _read_persisted_tokens(signature):
+    try:
+        table = pq.read_table(TOKENS_PATH)
+    except (FileNotFoundError, OSError):
+        return None
+    metadata = table.schema.metadata or {}
+    if metadata.get(b'snapshot') != signature.encode() or metadata.get(b'encoding') != ENCODING_NAME.encode():
+        return None
+    return table.column('tokens').to_numpy()
+
+
+def build_token_column():
+    """Tokeniza todas as falas do snapshot e grava a coluna de tokens em disco."""
+    signature = simpsons_data.snapshot_signature()
+    spoken_words = simpsons_data.load_simpsons_data(columns=simpsons_data.columns_for('tokens'))['spoken_words']
+    counts = count_tokens_batch(spoken_words)
+
+    table = pa.table({'tokens': counts}).replace_schema_metadata({
+        'snapshot': signature,
+        'encoding': ENCODING_NAME,
+    })
+    simpsons_data.atomic_write(TOKENS_PATH, lambda tmp_path: pq.write_table(table, tmp_path))
+    return counts
+
+
+def load_token_counts():
+    """
+    Retorna a contagem de tokens por fala, alinhada com load_simpsons_data().
+
+    A coluna só é recalculada quando o snapshot muda.
+    """
+    counts = _read_persisted_tokens(simpsons_data.snapshot_signature())
+    if counts is None:
+        counts = build_token_column()
+    return pd.Series(counts, name='tokens')
+
+
+# Cubo de estatísticas de tokens.
+# A tabela por episódio guarda somas, número de falas e máximos; a tabela por
+# temporada é derivada dela (poucas linhas), então nunca é preciso reagregar
+# o frame de falas para desenhar a aba de tokens.
+
+TOKEN_STATS_PATH = os.path.join(simpsons_data.CACHE_DIR, 'simpsons_token_stats.parquet')
+# tipos fixos da tabela por episódio: não dependem do modo de carga (tipos Arrow compactos no
+# modo lean) nem do caminho (reconstrução, atualização incremental ou leitura do disco)
+EPISODE_STATS_DTYPES = {'season': 'int32', 'tokens_sum': 'int64', 'lines': 'int64', 'tokens_max': 'int32'}
+
+
+def _aggregate_lines(lines):
+    # soma em int64: a coluna de tokens é compacta (int32 ou menor)
+    lines = lines.assign(tokens=lines['tokens'].astype('int64'))
+    return lines.groupby('episode_id').agg(
+        season=('season', 'first'),
+        tokens_sum=('tokens', 'sum'),
+        lines=('tokens', 'size'),
+        tokens_max=('tokens', 'max'),
+    )
+
+
+def _finalize_episode_stats(episode_stats):
+    episode_stats = episode_stats[list(EPISODE_STATS_DTYPES)].astype(EPISODE_STATS_DTYPES)
+    episode_stats.index = episode_stats.index.astype('int32')
+    episode_stats['tokens_mean'] = episode_stats['tokens_sum'] / episode_stats['lines']
+    return episode_stats.sort_index()
+
+
+def build_token_stats(lines):
+    """
+    Agrega, numa única passada, as estatísticas de tokens por episódio.
+
+    :param lines: DataFrame com as colunas 'episode_id', 'season' e 'tokens'
+    :return: DataFrame indexado por episode_id com season, tokens_sum, lines, tokens_max e tokens_mean
+    """
+    return _finalize_episode_stats(_aggregate_lines(lines))
+
+
+def update_token_stats(episode_stats, new_lines):
+    """
+    Incorpora novas falas (de episódios novos ou existentes) ao cubo, sem reagregar o corpus.
+
+    :param episode_stats: Tabela por episódio retornada por build_token_stats
+    :param new_lines: DataFrame com as colunas 'episode_id', 'season' e 'tokens'
+    :return: Nova tabela por episódio
+    """
+    delta = _aggregate_lines(new_lines)
+    combined = episode_stats[['season', 'tokens_sum', 'lines', 'tokens_max']].reindex(
+        episode_stats.index.union(delta.index)
+    )
+    known = combined.index.intersection(delta.index)
+    combined.loc[known, 'tokens_sum'] += delta.loc[known, 'tokens_sum']
+    combined.loc[known, 'lines'] += delta.loc[known, 'lines']
+    combined.loc[known, 'tokens_max'] = np.maximum(combined.loc[known, 'tokens_max'], delta.loc[known, 'tokens_max'])
+
+    new = delta.index.difference(episode_stats.index)
+    combined.loc[new] = delta.loc[new]
+    return _finalize_episode_stats(combined)
+
+
+def season_token_stats(episode_stats):
+    """Deriva a tabela por temporada (soma, média e máximo por episódio) da tabela por episódio."""
+    grouped = episode_stats.groupby('season')['tokens_sum']
+    season_stats = grouped.agg(tokens_sum='sum', episodes='size', tokens_mean='mean', tokens_max='max')
+    season_stats['max_episode_id'] = grouped.idxmax()
+    return season_stats
+
+
+def _line_ids(lines):
+    # ids malformados (linhas quebradas do CSV) contam como falas antigas
+    return pd.to_numeric(lines['id_y'], errors='coerce').fillna(-1).to_numpy()
+
+
+def _save_token_stats(episode_stats, signature, line_ids, tokens):
+    table = pa.Table.from_pandas(episode_stats)
+    table = table.replace_schema_metadata({
+        **table.schema.metadata,
+        b'snapshot': signature.encode(),
+        # cobertura da tabela, para incorporar só as falas novas quando o snapshot mudar
+        b'max_line_id': str(int(line_ids.max()) if len(line_ids) else -1).encode(),
+        b'lines': str(len(line_ids)).encode(),
+        b'tokens': str(int(tokens.sum())).encode(),
+    })
+    simpsons_data.atomic_write(TOKEN_STATS_PATH, lambda tmp_path: pq.write_table(table, tmp_path))
+
+
+def _incremental_token_stats(table, lines, line_ids, tokens):
+    """
+    Atualiza a tabela persistida com as falas de id maior que o último id coberto.
+
+    Só vale se as falas antigas continuam as mesmas (mesma quantidade e mesma soma de
+    tokens); caso contrário devolve None e a tabela é reconstruída.
+    """
+    metadata = table.schema.metadata or {}
+    if b'max_line_id' not in metadata:
+        return None
+    old = line_ids <= int(metadata[b'max_line_id'])
+    if old.sum() != int(metadata[b'lines']) or tokens[old].sum() != int(metadata[b'tokens']):
+        return None
+    episode_stats = table.to_pandas()
+    if old.all():
+        return _finalize_episode_stats(episode_stats)
+    return update_token_stats(episode_stats, lines[~old])
+
+
+def load_token_stats():
+    """
+    Retorna (estatísticas por episódio, estatísticas por temporada).
+
+    A tabela por episódio é persistida ao lado do snapshot. Quando o snapshot muda,
+    as falas novas (ids acima dos já cobertos) são incorporadas com update_token_stats;
+    a tabela só é reconstruída do zero se falas antigas mudaram.
+    """
+    signature = simpsons_data.snapshot_signature()
+    try:
+        table = pq.read_table(TOKEN_STATS_PATH)
+    except (FileNotFoundError, OSError):
+        table = None
+
+    if table is not None and (table.schema.metadata or {}).get(b'snapshot') == signature.encode():
+        episode_stats = _finalize_episode_stats(table.to_pandas())
+    else:
+        lines = simpsons_data.load_simpsons_data(columns=simpsons_data.columns_for('token_stats'))
+        lines['tokens'] = load_token_counts().to_numpy()
+        # falas sem episódio no CSV de episódios não têm temporada: ficam fora do cubo
+        lines = lines[lines['season'].notna()]
+        line_ids = _line_ids(lines)
+        tokens = lines['tokens'].to_numpy()
+
+        episode_stats = _incremental_token_stats(table, lines, line_ids, tokens) if table is not None else None
+        if episode_stats is None:
+            episode_stats = build_token_stats(lines)
+        _save_token_stats(episode_stats, signature, line_ids, tokens)
+
+    return episode_stats, season_token_stats(episode_stats)
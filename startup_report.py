@@ -0,0 +1,108 @@
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Relatório de tempo de inicialização (cold start) dos apps Streamlit.
+# Lista os imports de nível de módulo de um script e os mede num processo Python
+# novo com `-X importtime`, como aconteceria na primeira execução do app.
+#
+# Uso: python startup_report.py app_q6-10.py [--budget-ms 1500]
+
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '1500'))
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( +)(\S.*)$')
+
+_MEASURE_SCRIPT = """
+import json, sys
+failed = []
+for module in sys.argv[1:]:
+    try:
+        # __import__ (e não importlib) para que -X importtime registre a importação
+        __import__(module)
+    except Exception:
+        failed.append(module)
+print(json.dumps(failed))
+"""
+
+
+def top_level_imports(script_path):
+    """Módulos importados no nível do módulo (fora de funções) pelo script."""
+    with open(script_path, 'r', encoding='utf-8-sig') as file:
+        tree = ast.parse(file.read(), filename=script_path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def measure_imports(modules, cwd=None):
+    """
+    Importa os módulos, na ordem, num interpretador novo com `-X importtime`.
+
+    Cada módulo recebe o tempo cumulativo da sua importação, incluindo as dependências
+    que ele foi o primeiro a carregar, de modo que a soma é o custo total de importação.
+
+    :return: dict módulo -> ms (None se a importação falhou; 0 se já havia sido carregado)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _MEASURE_SCRIPT, *modules],
+        capture_output=True, text=True, cwd=cwd,
+    )
+    failed = set(json.loads(result.stdout.strip().splitlines()[-1])) if result.returncode == 0 else set(modules)
+
+    top_level = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        # só as entradas de primeiro nível (as aninhadas têm mais de um espaço de indentação)
+        if match and len(match.group(3)) == 1:
+            top_level[match.group(4).strip()] = int(match.group(2)) / 1000
+
+    timings = {}
+    for module in modules:
+        if module in failed:
+            timings[module] = None
+        else:
+            # submódulos ("a.b") aparecem como entradas separadas para "a" e "a.b"
+            parts = module.split('.')
+            timings[module] = sum(top_level.get('.'.join(parts[:i + 1]), 0) for i in range(len(parts)))
+    return timings
+
+
+def startup_report(script_path, budget_ms=STARTUP_BUDGET_MS):
+    """
+    Mede o custo de importação de cada módulo importado no nível do módulo pelo script.
+
+    :return: (lista de (módulo, ms) em ordem decrescente, total em ms, dentro do orçamento?)
+    """
+    cwd = os.path.dirname(os.path.abspath(script_path))
+    timings = list(measure_imports(top_level_imports(script_path), cwd=cwd).items())
+    timings.sort(key=lambda item: -(item[1] or 0))
+    total = sum(ms for _, ms in timings if ms is not None)
+    return timings, total, total <= budget_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de tempo de importação (cold start) de um app.")
+    parser.add_argument('script', help="Script do app (ex.: app_q6-10.py)")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help="Orçamento de inicialização em milissegundos")
+    args = parser.parse_args()
+
+    timings, total, within_budget = startup_report(args.script, args.budget_ms)
+    print(f"{'módulo':<40} {'ms':>10}")
+    for module, ms in timings:
+        print(f"{module:<40} {'erro' if ms is None else f'{ms:.1f}':>10}")
+    print(f"{'total':<40} {total:>10.1f}")
+    print(f"orçamento: {args.budget_ms:.0f} ms -> {'OK' if within_budget else 'EXCEDIDO'}")
+    sys.exit(0 if within_budget else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,65 +1,221 @@
-from nltk.translate.bleu_score import sentence_bleu
-from rouge import Rouge
-from googletrans import Translator
-from deep_translator import GoogleTranslator
+# numpy, pandas e o serviço de tradução são importados no primeiro uso, não na importação do módulo
 
-# Inicializar o tradutor e o Rouge
-translator = Translator()
-rouge = Rouge()
+METRIC_NAMES = ['bleu', 'rouge-1', 'rouge-2', 'rouge-l']
+# entra na chave do artefato de métricas: mudar a definição das métricas invalida os valores persistidos
+METRICS_VERSION = 2
+BLEU_MAX_N = 4
 
-def translate_text(text, target_lang='en'):
+def translate_texts(texts, target_lang='en'):
+    # uma requisição por lote, com cache em disco (ver translation.py)
+    from translation import get_translation_service
     try:
-        translator = GoogleTranslator(source='auto', target=target_lang)
-        return translator.translate(text)
+        return get_translation_service().translate(texts, target_lang)
     except Exception as e:
         print(f"Erro na tradução: {e}")
-        return text
+        return list(texts)
 
-def calculate_metrics(reference, hypothesis):
-    # Calcular BLEU
-    reference_tokens = reference.split()
-    hypothesis_tokens = hypothesis.split()
-    bleu_score = sentence_bleu([reference_tokens], hypothesis_tokens)
-    
-    # Calcular ROUGE
-    rouge_scores = rouge.get_scores(hypothesis, reference)[0]
-    
+def translate_text(text, target_lang='en'):
+    return translate_texts([text], target_lang)[0]
+
+def _rouge_f(overlap, hyp_count, ref_count):
+    # F1 como o pacote rouge (inclusive o 1e-8 no denominador)
+    precision = overlap / hyp_count if hyp_count else 0.0
+    recall = overlap / ref_count if ref_count else 0.0
+    return 2.0 * ((precision * recall) / (precision + recall + 1e-8))
+
+def _rouge_sentences(text):
+    # frases e palavras como no pacote rouge: corte em ".", espaços normalizados, palavras por " "
+    return [' '.join(part.split()).split(' ') for part in text.split('.') if len(part) > 0]
+
+def _ngrams(words, n):
+    return set(zip(*(words[i:] for i in range(n))))
+
+def _lcs_words(x, y):
+    """Palavras de uma LCS entre x e y, com o mesmo desempate da reconstrução do pacote rouge."""
+    # frases curtas: listas do Python saem mais baratas que linhas numpy
+    table = [[0] * (len(y) + 1)]
+    for word in x:
+        previous, row = table[-1], [0]
+        for j, other in enumerate(y):
+            if word == other:
+                row.append(previous[j] + 1)
+            else:
+                row.append(previous[j + 1] if previous[j + 1] > row[j] else row[j])
+        table.append(row)
+
+    words = []
+    i, j = len(x), len(y)
+    while i > 0 and j > 0:
+        if x[i - 1] == y[j - 1]:
+            words.append(x[i - 1])
+            i, j = i - 1, j - 1
+        elif table[i - 1][j] > table[i][j - 1]:
+            i -= 1
+        else:
+            j -= 1
+    return words
+
+def _rouge_reference(text):
+    # tudo o que o ROUGE precisa da referência, calculado uma vez por lote
+    sentences = _rouge_sentences(text)
+    words = [word for sentence in sentences for word in sentence]
     return {
-        'bleu': bleu_score,
-        'rouge-1': rouge_scores['rouge-1']['f'],
-        'rouge-2': rouge_scores['rouge-2']['f'],
-        'rouge-l': rouge_scores['rouge-l']['f']
+        'sentences': [(sentence, set(sentence)) for sentence in sentences],
+        'ngrams': {n: _ngrams(words, n) for n in (1, 2)},
+        'vocabulary': set(words),
     }
 
-def compare_summaries(reference_summary, final_summary, chunk_summaries):
-    final_metrics = calculate_metrics(reference_summary, final_summary)
-    
-    chunk_metrics = []
-    for chunk_summary in chunk_summaries:
-        chunk_metrics.append(calculate_metrics(reference_summary, chunk_summary))
-    
+def _rouge_scores(reference, hypothesis):
+    hypothesis_sentences = _rouge_sentences(hypothesis)
+    if not hypothesis_sentences or not reference['sentences']:
+        # o pacote rouge recusa textos vazios
+        return 0.0, 0.0, 0.0
+    words = [word for sentence in hypothesis_sentences for word in sentence]
+    scores = []
+    for n in (1, 2):
+        # n-gramas distintos do texto inteiro (atravessam as frases)
+        ngrams = _ngrams(words, n)
+        scores.append(_rouge_f(len(ngrams & reference['ngrams'][n]), len(ngrams), len(reference['ngrams'][n])))
+
+    # ROUGE-L no nível do resumo: união das palavras das LCS de cada par (frase da referência, frase do resumo)
+    lcs_union = set()
+    hypothesis_vocabularies = [set(sentence) for sentence in hypothesis_sentences]
+    for reference_sentence, reference_vocabulary in reference['sentences']:
+        for hypothesis_sentence, vocabulary in zip(hypothesis_sentences, hypothesis_vocabularies):
+            # frases sem palavras em comum não contribuem para a união
+            if not vocabulary.isdisjoint(reference_vocabulary):
+                lcs_union.update(_lcs_words(reference_sentence, hypothesis_sentence))
+    scores.append(_rouge_f(len(lcs_union), len(set(words)), len(reference['vocabulary'])))
+    return tuple(scores)
+
+def score_batch(reference, hypotheses):
+    """
+    Calcula BLEU e ROUGE-1/2/L (F1) de vários resumos contra a mesma referência.
+
+    Os valores são os do sentence_bleu do nltk e do pacote rouge (ver benchmarks/metrics_check.py).
+    A referência é tokenizada uma única vez; as contagens de n-gramas do BLEU de todos os
+    resumos são feitas de uma vez com numpy.
+
+    :param reference: Texto de referência
+    :param hypotheses: Lista de textos a avaliar
+    :return: DataFrame com uma linha por resumo e as colunas de METRIC_NAMES
+    """
+    import numpy as np
+    import pandas as pd
+
+    reference_tokens = reference.split()
+    vocabulary = {token: i for i, token in enumerate(dict.fromkeys(reference_tokens))}
+    vocabulary_size = max(len(vocabulary), 1)
+    reference_ids = np.array([vocabulary[token] for token in reference_tokens], dtype=np.int64)
+
+    hypothesis_tokens = [hypothesis.split() for hypothesis in hypotheses]
+    num_hypotheses = len(hypothesis_tokens)
+    lengths = np.array([len(tokens) for tokens in hypothesis_tokens], dtype=np.int64)
+    # todos os resumos concatenados; tokens fora do vocabulário da referência viram -1
+    flat_ids = np.array([vocabulary.get(token, -1) for tokens in hypothesis_tokens for token in tokens], dtype=np.int64)
+    owner = np.repeat(np.arange(num_hypotheses), lengths)
+
+    # n-gramas são identificados pelo índice do (n-1)-grama na referência mais o token seguinte,
+    # então os códigos nunca passam de len(referência) * vocabulário
+    overlaps, hyp_totals = {}, {}
+    reference_level, hypothesis_level = reference_ids, flat_ids
+    for n in range(1, BLEU_MAX_N + 1):
+        if n == 1:
+            reference_codes, hypothesis_codes = reference_ids, flat_ids
+        else:
+            reference_codes = reference_level[:-1] * vocabulary_size + reference_ids[n - 1:]
+            valid = (hypothesis_level[:-1] >= 0) & (flat_ids[n - 1:] >= 0) & (owner[:-(n - 1)] == owner[n - 1:])
+            hypothesis_codes = np.where(valid, hypothesis_level[:-1] * vocabulary_size + flat_ids[n - 1:], -1)
+        starts = owner[:len(hypothesis_codes)]
+
+        unique_codes, reference_level, reference_counts = np.unique(
+            reference_codes, return_inverse=True, return_counts=True
+        )
+        if len(unique_codes):
+            positions = np.minimum(np.searchsorted(unique_codes, hypothesis_codes), len(unique_codes) - 1)
+            found = (hypothesis_codes >= 0) & (unique_codes[positions] == hypothesis_codes)
+        else:
+            positions = np.zeros(len(hypothesis_codes), dtype=np.int64)
+            found = np.zeros(len(hypothesis_codes), dtype=bool)
+        hypothesis_level = np.where(found, positions, -1)
+
+        # matriz resumos x n-gramas da referência; o mínimo com a contagem na referência é o recorte do BLEU
+        counts = np.bincount(
+            starts[found] * len(unique_codes) + positions[found],
+            minlength=num_hypotheses * len(unique_codes),
+        ).reshape(num_hypotheses, len(unique_codes))
+        overlaps[n] = np.minimum(counts, reference_counts).sum(axis=1)
+        hyp_totals[n] = np.maximum(lengths - n + 1, 0)
+
+    # BLEU como o sentence_bleu do nltk (pesos uniformes, sem suavização): zero se alguma precisão for zero
+    precisions = np.stack([
+        np.divide(overlaps[n], hyp_totals[n], out=np.zeros(num_hypotheses), where=hyp_totals[n] > 0)
+        for n in range(1, BLEU_MAX_N + 1)
+    ])
+    with np.errstate(divide='ignore'):
+        geometric_mean = np.where((precisions > 0).all(axis=0), np.exp(np.log(precisions).mean(axis=0)), 0.0)
+    reference_length = len(reference_tokens)
+    brevity_penalty = np.where(
+        lengths > reference_length, 1.0,
+        np.exp(1 - reference_length / np.maximum(lengths, 1)),
+    )
+    bleu = np.where(lengths > 0, brevity_penalty * geometric_mean, 0.0)
+
+    rouge_reference = _rouge_reference(reference)
+    rouge = np.array(
+        [_rouge_scores(rouge_reference, hypothesis) for hypothesis in hypotheses], dtype=np.float64
+    ).reshape(num_hypotheses, 3)
+
+    return pd.DataFrame({
+        'bleu': bleu,
+        'rouge-1': rouge[:, 0],
+        'rouge-2': rouge[:, 1],
+        'rouge-l': rouge[:, 2],
+    }, columns=METRIC_NAMES)
+
+def calculate_metrics(reference, hypothesis):
+    return score_batch(reference, [hypothesis]).iloc[0].to_dict()
+
+def compare_summaries(reference_summary, final_summary, chunk_summaries, target_lang=None):
+    """
+    :param target_lang: Se informado, os resumos são traduzidos (num único lote) antes da avaliação
+    """
+    texts = [reference_summary, final_summary] + list(chunk_summaries)
+    if target_lang:
+        texts = translate_texts(texts, target_lang)
+
+    # resumo final e resumos dos chunks avaliados numa única chamada
+    scores = score_batch(texts[0], texts[1:])
+    final_metrics = scores.iloc[0].to_dict()
+    chunk_metrics = scores.iloc[1:].to_dict('records')
+
     return final_metrics, chunk_metrics
 
-def analyze_convergence(reference_summary, final_summary, chunk_summaries):
-    final_metrics, chunk_metrics = compare_summaries(reference_summary, final_summary, chunk_summaries)
-    
+def analyze_convergence(reference_summary, final_summary, chunk_summaries, metrics=None):
+    """
+    :param metrics: Resultado de compare_summaries já calculado (evita avaliar os resumos de novo)
+    """
+    if metrics is None:
+        metrics = compare_summaries(reference_summary, final_summary, chunk_summaries)
+    final_metrics, chunk_metrics = metrics
+
     # Analisar convergência
     convergence_analysis = "Os resumos parecem convergir em termos de conteúdo principal, mas há algumas diferenças notáveis:\n\n"
-    
+
     # Comparar métricas do resumo final com a média das métricas dos chunks
     avg_chunk_metrics = {
         key: sum(chunk[key] for chunk in chunk_metrics) / len(chunk_metrics)
         for key in chunk_metrics[0]
     }
-    
+
     for key in final_metrics:
         diff = final_metrics[key] - avg_chunk_metrics[key]
         convergence_analysis += f"- {key.upper()}: A diferença entre o resumo final e a média dos chunks é {diff:.4f}\n"
-    
+
     # Analisar informações omitidas
     omitted_info = "Informações potencialmente omitidas entre os dois resumos:\n\n"
-    
+
     # Aqui você pode implementar uma lógica mais sofisticada para detectar informações omitidas
     # Por exemplo, comparando entidades nomeadas ou frases-chave entre os resumos
-    
-    return convergence_analysis, omitted_info
\ No newline at end of file
+
+    return convergence_analysis, omitted_info
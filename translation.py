@@ -0,0 +1,164 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Serviço de tradução com lotes e cache em disco.
+# Os textos que ainda não estão no cache são agrupados em lotes (várias traduções
+# por requisição) e enviados ao backend configurado; cada tradução é gravada num
+# SQLite com chave (backend, idioma de destino, hash do texto).
+
+TRANSLATION_BACKEND = os.getenv('TRANSLATION_BACKEND', 'google')
+TRANSLATION_CACHE_PATH = os.getenv('TRANSLATION_CACHE_PATH', os.path.join('data', 'cache', 'translations.sqlite'))
+# limite de caracteres por requisição do Google Tradutor (5000), com folga para os separadores
+TRANSLATION_MAX_CHARS = int(os.getenv('TRANSLATION_MAX_CHARS', '4500'))
+
+
+class GoogleBackend:
+    """
+    Google Tradutor via deep_translator.
+
+    Um lote é enviado numa única requisição: os textos são unidos por um separador
+    e a tradução é dividida de volta. Se o separador não voltar intacto, o lote é
+    traduzido texto a texto.
+    """
+
+    name = 'google'
+    separator = '\n|||\n'
+
+    def translate_batch(self, texts, target_lang):
+        from deep_translator import GoogleTranslator
+        translator = GoogleTranslator(source='auto', target=target_lang)
+        translated = translator.translate(self.separator.join(texts))
+        parts = [part.strip() for part in (translated or '').split('|||')]
+        if len(parts) == len(texts):
+            return parts
+        return [translator.translate(text) for text in texts]
+
+
+class OfflineBackend:
+    """Backend local para testes: devolve os textos sem traduzir e conta as requisições."""
+
+    name = 'offline'
+    separator = '\n'
+
+    def __init__(self):
+        self.requests = 0
+
+    def translate_batch(self, texts, target_lang):
+        self.requests += 1
+        return list(texts)
+
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'offline': OfflineBackend,
+}
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class TranslationService:
+    """
+    Traduz listas de textos consultando o cache antes do backend.
+
+    :param backend: Objeto com name e translate_batch(texts, target_lang)
+    :param cache_path: Arquivo SQLite do cache (None desativa o cache)
+    :param max_chars: Máximo de caracteres por lote enviado ao backend
+    """
+
+    def __init__(self, backend, cache_path=TRANSLATION_CACHE_PATH, max_chars=TRANSLATION_MAX_CHARS):
+        self.backend = backend
+        self.cache_path = cache_path
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.cache_path, timeout=30)
+        try:
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS translations ('
+                    ' backend TEXT NOT NULL, target_lang TEXT NOT NULL, text_hash TEXT NOT NULL,'
+                    ' translation TEXT NOT NULL, PRIMARY KEY (backend, target_lang, text_hash))'
+                )
+                yield connection
+        finally:
+            connection.close()
+
+    def _cached(self, hashes, target_lang):
+        if self.cache_path is None or not hashes:
+            return {}
+        found = {}
+        with self._lock, self._transaction() as connection:
+            unique = list(dict.fromkeys(hashes))
+            # consulta em blocos para não passar do limite de parâmetros do SQLite
+            for start in range(0, len(unique), 500):
+                block = unique[start:start + 500]
+                rows = connection.execute(
+                    'SELECT text_hash, translation FROM translations WHERE backend = ? AND target_lang = ?'
+                    f' AND text_hash IN ({",".join("?" * len(block))})',
+                    (self.backend.name, target_lang, *block),
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def _store(self, translations, target_lang):
+        if self.cache_path is None or not translations:
+            return
+        with self._lock, self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO translations (backend, target_lang, text_hash, translation) VALUES (?, ?, ?, ?)',
+                [(self.backend.name, target_lang, key, value) for key, value in translations.items()],
+            )
+
+    def _batches(self, texts):
+        batch, size = [], 0
+        separator = len(self.backend.separator)
+        for text in texts:
+            if batch and size + len(text) + separator > self.max_chars:
+                yield batch
+                batch, size = [], 0
+            batch.append(text)
+            size += len(text) + separator
+        if batch:
+            yield batch
+
+    def translate(self, texts, target_lang='en'):
+        """
+        Traduz uma lista de textos.
+
+        :param texts: Lista de textos
+        :param target_lang: Idioma de destino
+        :return: Lista de traduções, alinhada com texts
+        """
+        texts = list(texts)
+        hashes = [text_hash(text) for text in texts]
+        translations = self._cached(hashes, target_lang)
+
+        missing = {key: text for key, text in zip(hashes, texts) if key not in translations and text.strip()}
+        for batch in self._batches(list(missing.values())):
+            translated = self.backend.translate_batch(batch, target_lang)
+            new = {text_hash(text): result for text, result in zip(batch, translated) if result}
+            self._store(new, target_lang)
+            translations.update(new)
+
+        return [translations.get(key, text) for key, text in zip(hashes, texts)]
+
+
+_services = {}
+
+
+def get_translation_service(backend=None):
+    """Serviço compartilhado do backend informado (padrão: TRANSLATION_BACKEND)."""
+    backend = backend or TRANSLATION_BACKEND
+    if backend not in _services:
+        _services[backend] = TranslationService(BACKENDS[backend]())
+    return _services[backend]